@@ -122,17 +122,8 @@ export default function Home() {
   const loadPosts = useCallback(async () => {
     if (!token) return;
     try {
-      const allPosts = (await fetchPosts(token)) as Post[];
-
-      // Get top 5 most upvoted posts
-      const topPosts = [...allPosts].sort((a, b) => b.votes - a.votes).slice(0, 5);
-
-      // Get 5 random posts (excluding top posts)
-      const remainingPosts = allPosts.filter((p) => !topPosts.some((tp) => tp.id === p.id));
-      const randomPosts = [...remainingPosts].sort(() => Math.random() - 0.5).slice(0, 5);
-
-      // Combine: top 5 + random 5 (or less if not enough posts)
-      const displayPosts = [...topPosts, ...randomPosts].slice(0, 10);
+      // Server picks the top 5 most upvoted posts followed by 5 random others.
+      const displayPosts = (await fetchPosts(token, "feed")) as Post[];
       setPosts(displayPosts);
       setMyVotes(() => {
         const next: Record<string, Vote> = {};
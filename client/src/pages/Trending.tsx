@@ -3,7 +3,7 @@ import type { Sidequest } from "../types/sidequest";
 import SidequestCard from "../components/SidequestCard";
 import SubmitQuestModal from "../components/SubmitQuestModal";
 import ShareQuestModal from "../components/ShareQuestModal";
-import { fetchQuests, createQuest, voteQuest, getQuestDifficulty } from "../services/api";
+import { fetchQuests, createQuest, voteQuest } from "../services/api";
 import { useAuth } from "../context/AuthContext";
 import LiquidEther from "../components/LiquidEther";
 
@@ -26,7 +26,7 @@ export default function Trending() {
   const [questDifficulties, setQuestDifficulties] = useState<Record<string, { difficulty: number; difficultyLabel: string }>>({});
 
   useEffect(() => {
-    fetchQuests({ period: timePeriod, token: token ?? undefined }).then(async (qs) => {
+    fetchQuests({ period: timePeriod, token: token ?? undefined, includeDifficulty: true }).then((qs) => {
       setQuests(qs);
       const next: Record<string, Vote> = {};
       for (const q of qs as Sidequest[]) {
@@ -34,48 +34,31 @@ export default function Trending() {
       }
       setMyVotes(next);
 
-      // Fetch difficulty for each quest
-      const difficultyPromises = (qs as Sidequest[]).map(async (q) => {
-        try {
-          const difficultyData = await getQuestDifficulty(q.id);
-          const completionRate = difficultyData.completion_rate;
-
-          // Determine difficulty level (same logic as in Home.tsx and Profile.tsx)
-          let difficulty = 0;
-          let difficultyLabel = "surface";
-          if (completionRate >= 80) {
-            difficulty = 1;
-            difficultyLabel = "surface";
-          } else if (completionRate >= 60) {
-            difficulty = 2;
-            difficultyLabel = "twilight";
-          } else if (completionRate >= 40) {
-            difficulty = 3;
-            difficultyLabel = "midnight";
-          } else if (completionRate >= 20) {
-            difficulty = 4;
-            difficultyLabel = "abyssal";
-          } else if (completionRate >= 5) {
-            difficulty = 5;
-            difficultyLabel = "hadal";
-          } else {
-            difficulty = 5;
-            difficultyLabel = "hadal";
-          }
-
-          return { questId: q.id, difficulty, difficultyLabel };
-        } catch (error) {
-          console.error(`Failed to fetch difficulty for quest ${q.id}:`, error);
-          return null;
-        }
-      });
-
-      const difficulties = await Promise.all(difficultyPromises);
+      // Difficulty comes back with the quests (include_difficulty).
       const difficultyMap: Record<string, { difficulty: number; difficultyLabel: string }> = {};
-      for (const d of difficulties) {
-        if (d) {
-          difficultyMap[d.questId] = { difficulty: d.difficulty, difficultyLabel: d.difficultyLabel };
+      for (const q of qs as Sidequest[]) {
+        const completionRate = q.completion_rate;
+        if (completionRate == null) continue;
+        // Determine difficulty level (same logic as in Home.tsx and Profile.tsx)
+        let difficulty = 0;
+        let difficultyLabel = "surface";
+        if (completionRate >= 80) {
+          difficulty = 1;
+          difficultyLabel = "surface";
+        } else if (completionRate >= 60) {
+          difficulty = 2;
+          difficultyLabel = "twilight";
+        } else if (completionRate >= 40) {
+          difficulty = 3;
+          difficultyLabel = "midnight";
+        } else if (completionRate >= 20) {
+          difficulty = 4;
+          difficultyLabel = "abyssal";
+        } else {
+          difficulty = 5;
+          difficultyLabel = "hadal";
         }
+        difficultyMap[q.id] = { difficulty, difficultyLabel };
       }
       setQuestDifficulties(difficultyMap);
     });
@@ -1,27 +1,48 @@
+import type { Sidequest } from "../types/sidequest";
+
 const API = import.meta.env.VITE_API_URL;
 
 export async function fetchQuests({
   period = "all",
   token,
+  includeDifficulty = false,
 }: {
   period?: "all" | "month" | "week";
   token?: string;
+  // Fill in completion_rate on every quest (no separate difficulty calls).
+  includeDifficulty?: boolean;
 } = {}) {
-  const url = token
-    ? `${API}/quests/with_votes?period=${period}`
-    : `${API}/quests?period=${period}`;
-
-  const res = await fetch(url, {
-    headers: token
-      ? { Authorization: `Bearer ${token}` }
-      : undefined,
-  });
-
-  if (!res.ok) {
-    throw new Error("Failed to fetch quests");
+  const extra: Record<string, string> = includeDifficulty
+    ? { include_difficulty: "true" }
+    : {};
+  if (!token) {
+    const params = new URLSearchParams({ period, ...extra });
+    const res = await fetch(`${API}/quests?${params}`);
+    if (!res.ok) {
+      throw new Error("Failed to fetch quests");
+    }
+    return res.json();
   }
 
-  return res.json();
+  // /quests/with_votes is paginated: follow X-Next-Cursor until the last page.
+  const quests: Sidequest[] = [];
+  let cursor: string | null = null;
+  do {
+    const params = new URLSearchParams({ period, limit: "500", ...extra });
+    if (cursor) params.set("cursor", cursor);
+    const res = await fetch(`${API}/quests/with_votes?${params}`, {
+      headers: { Authorization: `Bearer ${token}` },
+    });
+
+    if (!res.ok) {
+      throw new Error("Failed to fetch quests");
+    }
+
+    quests.push(...(await res.json()));
+    cursor = res.headers.get("X-Next-Cursor");
+  } while (cursor);
+
+  return quests;
 }
 
 
@@ -146,6 +167,23 @@ export async function getQuestDifficulty(questId: string) {
   return res.json();
 }
 
+// /quests/difficulty takes at most this many ids per call.
+const DIFFICULTY_BATCH_SIZE = 200;
+
+export async function getQuestDifficulties(questIds: string[]) {
+  const rates: Record<string, { completion_rate: number }> = {};
+  for (let i = 0; i < questIds.length; i += DIFFICULTY_BATCH_SIZE) {
+    const params = new URLSearchParams();
+    for (const id of questIds.slice(i, i + DIFFICULTY_BATCH_SIZE)) params.append("ids", id);
+    const res = await fetch(`${API}/quests/difficulty?${params.toString()}`);
+    if (!res.ok) {
+      throw new Error("Failed to fetch quest difficulties");
+    }
+    Object.assign(rates, await res.json());
+  }
+  return rates;
+}
+
 export async function getQuestReceivedAt(token: string, questId: string) {
   const res = await fetch(`${API}/quests/${questId}/received-at`, {
     headers: { Authorization: `Bearer ${token}` },
@@ -262,8 +300,62 @@ export async function uploadPost(
   return res.json();
 }
 
-export async function fetchPosts(token: string) {
-  const res = await fetch(`${API}/posts`, {
+// Opt-in direct upload: the browser PUTs the file straight to R2 using a presigned
+// URL, then asks the backend to create the post. Requires CORS on the R2 bucket.
+export async function uploadPostDirect(
+  token: string,
+  file: File,
+  questId: string
+) {
+  const intentRes = await fetch(`${API}/posts/upload-intent`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      Authorization: `Bearer ${token}`,
+    },
+    body: JSON.stringify({
+      quest_id: questId,
+      content_type: file.type,
+      size: file.size,
+      filename: file.name,
+    }),
+  });
+  if (!intentRes.ok) {
+    const txt = await intentRes.text();
+    throw new Error(txt || "Failed to start upload");
+  }
+  const intent = await intentRes.json();
+
+  const putRes = await fetch(intent.upload_url, {
+    method: intent.method,
+    headers: intent.headers,
+    body: file,
+  });
+  if (!putRes.ok) {
+    throw new Error("Failed to upload file");
+  }
+
+  const res = await fetch(`${API}/posts/upload-finalize`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      Authorization: `Bearer ${token}`,
+    },
+    body: JSON.stringify({ quest_id: questId, key: intent.key }),
+  });
+  if (!res.ok) {
+    const txt = await res.text();
+    throw new Error(txt || "Failed to upload post");
+  }
+
+  return res.json();
+}
+
+export async function fetchPosts(
+  token: string,
+  mode: "all" | "feed" | "recent" | "friends" = "all"
+) {
+  const res = await fetch(`${API}/posts?mode=${mode}`, {
     headers: {
       Authorization: `Bearer ${token}`,
     },
@@ -311,8 +403,16 @@ export async function deletePost(token: string, postId: string) {
   return res.json();
 }
 
-export async function fetchComments(token: string, postId: string) {
-  const res = await fetch(`${API}/posts/${postId}/comments`, {
+export async function fetchComments(
+  token: string,
+  postId: string,
+  page?: { limit: number; cursor?: string | null }
+) {
+  const params = page
+    ? `?limit=${page.limit}` +
+      (page.cursor ? `&cursor=${encodeURIComponent(page.cursor)}` : "")
+    : "";
+  const res = await fetch(`${API}/posts/${postId}/comments${params}`, {
     headers: {
       Authorization: `Bearer ${token}`,
     },
@@ -395,3 +495,82 @@ export async function uploadProfilePicture(token: string, file: File) {
 
   return res.json();
 }
+
+export type ServerEvent =
+  | "post_vote"
+  | "quest_vote"
+  | "comment"
+  | "friend_request"
+  | "quest_shared";
+
+async function fetchStreamToken(token: string): Promise<string> {
+  const res = await fetch(`${API}/events/token`, {
+    method: "POST",
+    headers: { Authorization: `Bearer ${token}` },
+  });
+  if (!res.ok) throw new Error("Failed to get event stream token");
+  return (await res.json()).token;
+}
+
+// Push stream for the current user. The caller closes the returned handle.
+// The URL carries a short-lived stream token, never the login token, so every
+// (re)connect fetches a fresh one. Nothing is replayed, so re-fetch on "open".
+export function openEventStream(
+  token: string,
+  onEvent: (event: ServerEvent, data: any) => void,
+  onOpen?: () => void
+) {
+  const events: ServerEvent[] = [
+    "post_vote",
+    "quest_vote",
+    "comment",
+    "friend_request",
+    "quest_shared",
+  ];
+  let source: EventSource | null = null;
+  let closed = false;
+  let retryMs = 1000;
+
+  const reconnect = () => {
+    if (closed) return;
+    setTimeout(connect, retryMs);
+    retryMs = Math.min(retryMs * 2, 30000);
+  };
+
+  const connect = async () => {
+    if (closed) return;
+    let streamToken: string;
+    try {
+      streamToken = await fetchStreamToken(token);
+    } catch {
+      reconnect();
+      return;
+    }
+    if (closed) return;
+    source = new EventSource(
+      `${API}/events/?token=${encodeURIComponent(streamToken)}`
+    );
+    source.onopen = () => {
+      retryMs = 1000;
+      onOpen?.();
+    };
+    // EventSource's own retry would reuse the expired stream token.
+    source.onerror = () => {
+      source?.close();
+      reconnect();
+    };
+    for (const event of events) {
+      source.addEventListener(event, (e) =>
+        onEvent(event, JSON.parse((e as MessageEvent).data))
+      );
+    }
+  };
+
+  connect();
+  return {
+    close() {
+      closed = true;
+      source?.close();
+    },
+  };
+}
@@ -6,6 +6,7 @@ export interface Post {
   media_url: string;
   media_type: 'image' | 'video';
   votes: number;
+  comment_count?: number;
   my_vote?: -1 | 0 | 1;
   created_at?: string;
   poster_username?: string | null;
@@ -4,4 +4,6 @@ export type Sidequest ={
   icon: string;
   votes: number;
   my_vote?: -1 | 0 | 1;
+  // Only with fetchQuests({ includeDifficulty: true }).
+  completion_rate?: number | null;
 };
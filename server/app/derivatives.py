@@ -0,0 +1,117 @@
+import io
+import logging
+import os
+
+from .database import SessionLocal
+from .executors import derivative_executor
+from .models import Post, User
+from .storage import get_storage
+from .versions import bump
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it only originals are served.
+    Image = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def _widths(value: str) -> list[int]:
+    return sorted({int(w) for w in value.split(",") if w.strip()})
+
+
+# Widths (px) generated for each uploaded image. Widths >= the original are skipped.
+# - POST_DERIVATIVE_WIDTHS (optional, default "320,640,1280")
+# - PFP_DERIVATIVE_WIDTHS (optional, default "64,128,256")
+POST_DERIVATIVE_WIDTHS = _widths(os.getenv("POST_DERIVATIVE_WIDTHS", "320,640,1280"))
+PFP_DERIVATIVE_WIDTHS = _widths(os.getenv("PFP_DERIVATIVE_WIDTHS", "64,128,256"))
+
+# Display widths used to pick a variant when the client does not ask for one.
+# - POST_DISPLAY_WIDTH (optional, default 640)
+# - PFP_DISPLAY_WIDTH (optional, default 128)
+POST_DISPLAY_WIDTH = int(os.getenv("POST_DISPLAY_WIDTH", "640"))
+PFP_DISPLAY_WIDTH = int(os.getenv("PFP_DISPLAY_WIDTH", "128"))
+
+
+def pick_variant(key: str, variants: dict | None, width: int) -> str:
+    """
+    Smallest variant at least `width` px wide. If there is none (no variants yet,
+    or the original is narrower than `width`) the original key is the best choice.
+    """
+    if variants:
+        wide_enough = [int(w) for w in variants if int(w) >= width]
+        if wide_enough:
+            return variants[str(min(wide_enough))]
+    return key
+
+
+def _render(raw: bytes, widths: list[int]) -> list[tuple[int, bytes, str, str]]:
+    """
+    Resize `raw` to each width narrower than the original.
+    Returns (width, body, extension, content type) per variant, WebP when the
+    Pillow build supports it and JPEG otherwise.
+    """
+    with Image.open(io.BytesIO(raw)) as img:
+        img = ImageOps.exif_transpose(img)
+        Image.init()  # make sure all save plugins are registered before checking for WebP
+        use_webp = "WEBP" in Image.SAVE
+        has_alpha = img.mode in ("RGBA", "LA", "P")
+        img = img.convert("RGBA" if use_webp and has_alpha else "RGB")
+
+        out = []
+        for width in widths:
+            if width >= img.width:
+                break
+            height = max(1, round(img.height * width / img.width))
+            resized = img.resize((width, height), Image.LANCZOS)
+            buf = io.BytesIO()
+            if use_webp:
+                resized.save(buf, "WEBP", quality=80, method=4)
+                out.append((width, buf.getvalue(), "webp", "image/webp"))
+            else:
+                resized.save(buf, "JPEG", quality=82, optimize=True, progressive=True)
+                out.append((width, buf.getvalue(), "jpg", "image/jpeg"))
+        return out
+
+
+def _generate(model, row_id: str, key_attr: str, variants_attr: str, bucket: str, key: str, widths: list[int]):
+    storage = get_storage()
+    try:
+        rendered = _render(storage.get_object(bucket, key), widths)
+        variants = {}
+        base = os.path.splitext(key)[0]
+        for width, body, ext, content_type in rendered:
+            derived_key = f"{base}_w{width}.{ext}"
+            storage.put_object(bucket, derived_key, body, content_type)
+            variants[str(width)] = derived_key
+    except Exception:
+        logger.exception("Failed to build image variants for %s", key)
+        return
+
+    db = SessionLocal()
+    try:
+        row = db.get(model, row_id)
+        # Skip if the row was deleted or now points at a different upload.
+        if row is not None and getattr(row, key_attr) == key:
+            setattr(row, variants_attr, variants)
+            db.commit()
+            bump("posts" if model is Post else "users")
+    finally:
+        db.close()
+
+
+def schedule_post_derivatives(post_id: str, bucket: str, key: str, media_type: str) -> None:
+    if Image is None or media_type != "image" or not POST_DERIVATIVE_WIDTHS:
+        return
+    derivative_executor.submit(
+        _generate, Post, post_id, "media_url", "media_variants", bucket, key, POST_DERIVATIVE_WIDTHS
+    )
+
+
+def schedule_pfp_derivatives(user_id: str, bucket: str, key: str) -> None:
+    if Image is None or not PFP_DERIVATIVE_WIDTHS:
+        return
+    derivative_executor.submit(
+        _generate, User, user_id, "pfp_key", "pfp_variants", bucket, key, PFP_DERIVATIVE_WIDTHS
+    )
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # redis is optional; without it events only reach this worker's clients.
+    redis = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class TooManyConnections(Exception):
+    pass
+
+
+class Subscription:
+    """
+    One open event stream. Messages are queued on the stream's event loop in a
+    bounded queue; a consumer that falls `queue_size` messages behind is cut off
+    (the client reconnects and re-fetches) instead of buffering without limit.
+    """
+
+    def __init__(self, user_id: str, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def offer(self, message: bytes) -> None:
+        # Runs on self.loop.
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)  # tells the stream to close
+
+
+class LocalBackend:
+    """
+    Delivers straight to this process's subscribers (single worker).
+    """
+
+    broker: "EventBroker | None" = None
+
+    def start(self, broker: "EventBroker") -> None:
+        self.broker = broker
+
+    def publish(self, user_ids: list[str], message: bytes) -> None:
+        if self.broker is not None:  # None until the first stream opens: nobody to deliver to
+            self.broker.deliver(user_ids, message)
+
+
+class RedisBackend:
+    """
+    Fans events out through a Redis pub/sub channel, so a client connected to
+    one worker gets events published by any worker. The listener reconnects
+    with exponential backoff if the connection drops; events published while
+    it is down are lost (clients re-fetch on reconnect anyway).
+    """
+
+    channel = "events"
+    max_backoff = 30.0
+
+    def __init__(self, client):
+        self.client = client
+
+    def start(self, broker: "EventBroker") -> None:
+        self.broker = broker
+        threading.Thread(target=self._listen, name="events-redis", daemon=True).start()
+
+    def publish(self, user_ids: list[str], message: bytes) -> None:
+        self.client.publish(self.channel, json.dumps({"to": user_ids, "message": message.decode("utf-8")}))
+
+    def _listen(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                backoff = 1.0
+                for item in pubsub.listen():
+                    self._handle(item)
+            except Exception:
+                logger.exception("Lost the %s channel; reconnecting in %.0fs", self.channel, backoff)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _handle(self, item) -> None:
+        try:
+            payload = json.loads(item["data"])
+            self.broker.deliver(payload["to"], payload["message"].encode("utf-8"))
+        except Exception:
+            logger.exception("Bad event on the %s channel", self.channel)
+
+
+class EventBroker:
+    """
+    Per-user push channel. Routes call publish() after their commit; every
+    open stream of each recipient gets the event.
+
+    Publishing never blocks or fails the caller: each stream has a bounded
+    queue, and backend errors are logged and dropped.
+    """
+
+    def __init__(self, backend, max_connections: int = 1000, max_per_user: int = 5, queue_size: int = 100):
+        self.backend = backend
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self.queue_size = queue_size
+        self._subs: dict[str, set[Subscription]] = {}
+        self._count = 0
+        self._started = False
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: str) -> Subscription:
+        """
+        Open a stream for `user_id` on the running event loop.
+        Raises TooManyConnections when a connection limit is reached.
+        """
+        sub = Subscription(user_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            if not self._started:
+                self.backend.start(self)
+                self._started = True
+            if self._count >= self.max_connections:
+                raise TooManyConnections("Too many open event streams")
+            user_subs = self._subs.setdefault(user_id, set())
+            if len(user_subs) >= self.max_per_user:
+                raise TooManyConnections("Too many open event streams for this user")
+            user_subs.add(sub)
+            self._count += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            user_subs = self._subs.get(sub.user_id)
+            if user_subs and sub in user_subs:
+                user_subs.remove(sub)
+                self._count -= 1
+                if not user_subs:
+                    del self._subs[sub.user_id]
+
+    def publish(self, user_ids, event: str, data: dict, exclude: str | None = None) -> None:
+        """
+        Send `event` with JSON `data` to every open stream of `user_ids`
+        (except `exclude`, normally the user who caused the event).
+        """
+        user_ids = [u for u in dict.fromkeys(user_ids) if u and u != exclude]
+        if not user_ids:
+            return
+        message = f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode("utf-8")
+        try:
+            self.backend.publish(user_ids, message)
+        except Exception:
+            logger.exception("Failed to publish %s event", event)
+
+    def deliver(self, user_ids: list[str], message: bytes) -> None:
+        # Called from any thread; hands the message to each stream's own loop.
+        with self._lock:
+            subs = [sub for user_id in user_ids for sub in self._subs.get(user_id, ())]
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub.offer, message)
+            except RuntimeError:  # loop already closed
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"connections": self._count, "users": len(self._subs)}
+
+
+def _backend_from_env():
+    url = os.getenv("EVENTS_REDIS_URL")
+    if url:
+        if redis is None:
+            raise RuntimeError("EVENTS_REDIS_URL is set but the redis package is not installed")
+        return RedisBackend(redis.Redis.from_url(url))
+    return LocalBackend()
+
+
+# - EVENTS_REDIS_URL (optional; deliver events published on any worker)
+# - EVENTS_MAX_CONNECTIONS (optional, default 1000 per worker)
+# - EVENTS_MAX_CONNECTIONS_PER_USER (optional, default 5)
+# - EVENTS_QUEUE_SIZE (optional, default 100 undelivered events per stream)
+# - EVENTS_HEARTBEAT_SECONDS (optional, default 25)
+event_broker = EventBroker(
+    _backend_from_env(),
+    max_connections=int(os.getenv("EVENTS_MAX_CONNECTIONS", "1000")),
+    max_per_user=int(os.getenv("EVENTS_MAX_CONNECTIONS_PER_USER", "5")),
+    queue_size=int(os.getenv("EVENTS_QUEUE_SIZE", "100")),
+)
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "25"))
@@ -0,0 +1,36 @@
+import asyncio
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+
+
+# Dedicated pool for media uploads (storage + DB + signing). Kept separate from
+# FastAPI's shared threadpool so a burst of large uploads cannot starve sync routes.
+# - UPLOAD_WORKERS (optional, default 8)
+upload_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("UPLOAD_WORKERS", "8")),
+    thread_name_prefix="upload",
+)
+
+# Background image resizing for post media and profile pictures (see derivatives.py).
+# - DERIVATIVE_WORKERS (optional, default 2)
+derivative_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DERIVATIVE_WORKERS", "2")),
+    thread_name_prefix="derivatives",
+)
+
+# bcrypt hashing / verification for signup and login. Bounded so a credential
+# stuffing burst queues here instead of occupying every request thread.
+# - PASSWORD_HASH_WORKERS (optional, default 4)
+password_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", "4")),
+    thread_name_prefix="password-hash",
+)
+
+
+async def run_blocking(executor: Executor, fn, *args, **kwargs):
+    """
+    Run a blocking call on `executor` and await its result without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(fn, *args, **kwargs))
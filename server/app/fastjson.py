@@ -0,0 +1,80 @@
+import json
+import os
+
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder produces the same bytes, just slower.
+    orjson = None
+
+
+# Opt-in fast path for list endpoints: rows are encoded straight to bytes instead of
+# being validated and re-encoded through response_model. Lists with at least
+# FAST_JSON_STREAM_MIN_ROWS rows are sent as a streamed JSON array.
+# - FAST_JSON_RESPONSES (optional, default off; "1" to enable)
+# - FAST_JSON_STREAM_MIN_ROWS (optional, default 1000; 0 disables streaming)
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "0") == "1"
+FAST_JSON_STREAM_MIN_ROWS = int(os.getenv("FAST_JSON_STREAM_MIN_ROWS", "1000"))
+
+# Rows per chunk written to the socket when streaming.
+STREAM_CHUNK_ROWS = 256
+
+
+def dumps(content) -> bytes:
+    """
+    Encode to the same compact UTF-8 JSON FastAPI sends (no spaces, non-ASCII kept as is).
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def _iter_array(rows: list[dict]):
+    yield b"["
+    for start in range(0, len(rows), STREAM_CHUNK_ROWS):
+        chunk = b",".join(dumps(row) for row in rows[start:start + STREAM_CHUNK_ROWS])
+        yield chunk if start == 0 else b"," + chunk
+    yield b"]"
+
+
+def _carried_headers(response: Response | None) -> dict | None:
+    headers = dict(response.headers) if response is not None else None
+    if headers:
+        headers.pop("content-length", None)
+    return headers
+
+
+def encoded_response(body: bytes, response: Response | None = None) -> Response:
+    """
+    Send an already encoded JSON body (e.g. from a response cache), keeping the
+    headers set on `response`.
+    """
+    return Response(body, media_type="application/json", headers=_carried_headers(response))
+
+
+def list_response(rows: list[dict], response: Response | None = None):
+    """
+    Return `rows` from a list endpoint.
+
+    `rows` must hold JSON-ready values with keys in the response model's field
+    order, so both paths put the same bytes on the wire. With the fast path off
+    the rows go through response_model as usual. Headers already set on
+    `response` (e.g. X-Next-Cursor) are carried over when the fast path returns
+    its own Response.
+    """
+    if not FAST_JSON_RESPONSES:
+        return rows
+
+    headers = _carried_headers(response)
+    if FAST_JSON_STREAM_MIN_ROWS and len(rows) >= FAST_JSON_STREAM_MIN_ROWS:
+        return StreamingResponse(_iter_array(rows), media_type="application/json", headers=headers)
+    return FastJSONResponse(rows, headers=headers)
@@ -0,0 +1,181 @@
+from sqlalchemy import delete, func, insert, or_, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from . import timeline
+from .models import FriendRequest, User, friendships
+
+
+def _friend_count():
+    return (
+        select(func.count())
+        .select_from(friendships)
+        .where(friendships.c.user_id == User.id)
+        .scalar_subquery()
+    )
+
+
+def _refresh_friend_counts(db: Session, *user_ids: str) -> None:
+    db.execute(
+        update(User)
+        .where(User.id.in_(user_ids))
+        .values(friend_count=_friend_count())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def ensure_unique_index(conn: Connection) -> None:
+    """
+    Create ix_friendships_user_friend, the unique index add_friendship's
+    ON CONFLICT relies on. Tables written by the old /friends/add can hold
+    duplicate rows, which would make the index creation fail, so those are
+    collapsed first. Errors propagate: without the index every accepted
+    friend request would fail.
+    """
+    dupes = conn.execute(
+        select(friendships.c.user_id, friendships.c.friend_id)
+        .group_by(friendships.c.user_id, friendships.c.friend_id)
+        .having(func.count() > 1)
+    ).all()
+    for user_id, friend_id in dupes:
+        pair = (friendships.c.user_id == user_id) & (friendships.c.friend_id == friend_id)
+        conn.execute(delete(friendships).where(pair))
+        conn.execute(insert(friendships).values(user_id=user_id, friend_id=friend_id))
+    if dupes:
+        conn.execute(update(User).values(friend_count=_friend_count()))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_friendships_user_friend ON friendships (user_id, friend_id)"
+    ))
+
+
+def add_friendship(db: Session, user_id: str, friend_id: str) -> None:
+    """
+    Record an accepted friendship in both directions. Rows that already exist
+    are left alone, so this is safe to call twice. Also updates both users'
+    friend_count and seeds their friends timelines. The caller commits, then
+    bumps the "friendships" version.
+    """
+    dialect = db.get_bind().dialect.name
+    insert_ = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    db.execute(
+        insert_(friendships)
+        .values([
+            {"user_id": user_id, "friend_id": friend_id},
+            {"user_id": friend_id, "friend_id": user_id},
+        ])
+        .on_conflict_do_nothing(index_elements=["user_id", "friend_id"])
+    )
+    _refresh_friend_counts(db, user_id, friend_id)
+    timeline.connect(db, user_id, friend_id)
+
+
+def remove_friendship(db: Session, user_id: str, friend_id: str) -> int:
+    """
+    Delete both directions of a friendship, along with each side's posts in the
+    other's timeline. Returns the number of rows removed (0 if the two users
+    were not friends). The caller commits, then bumps the "friendships" version.
+    """
+    result = db.execute(
+        delete(friendships).where(
+            or_(
+                (friendships.c.user_id == user_id) & (friendships.c.friend_id == friend_id),
+                (friendships.c.user_id == friend_id) & (friendships.c.friend_id == user_id),
+            )
+        )
+    )
+    _refresh_friend_counts(db, user_id, friend_id)
+    timeline.disconnect(db, user_id, friend_id)
+    return result.rowcount
+
+
+def friend_ids_query(user_id: str):
+    """
+    SELECT of the ids of `user_id`'s friends, for use in IN (...) / joins.
+    """
+    return select(friendships.c.friend_id).where(friendships.c.user_id == user_id)
+
+
+def are_friends(db: Session, user_id: str, other_id: str) -> bool:
+    return db.execute(
+        select(friendships.c.user_id).where(
+            friendships.c.user_id == user_id,
+            friendships.c.friend_id == other_id,
+        )
+    ).first() is not None
+
+
+def suggest_friends(db: Session, user_id: str, limit: int = 20) -> list[dict]:
+    """
+    Friends of friends ranked by how many friends they share with `user_id`,
+    as dicts with id/username/mutual_friends. Existing friends and anyone with
+    a pending request to or from `user_id` are left out.
+
+    One grouped query over the friendships index: it touches each friend's
+    adjacency once, so cost grows with the size of the 2-hop neighbourhood
+    rather than with the number of users.
+    """
+    mine = friendships.alias("mine")
+    theirs = friendships.alias("theirs")
+    candidate = theirs.c.friend_id
+
+    pending = select(FriendRequest.to_user_id).where(
+        FriendRequest.from_user_id == user_id, FriendRequest.status == "pending"
+    ).union(
+        select(FriendRequest.from_user_id).where(
+            FriendRequest.to_user_id == user_id, FriendRequest.status == "pending"
+        )
+    )
+
+    # Rank on ids alone, then look up usernames for the winning page only.
+    ranked = (
+        select(candidate.label("id"), func.count().label("mutual_friends"))
+        .select_from(mine)
+        .join(theirs, theirs.c.user_id == mine.c.friend_id)
+        .where(
+            mine.c.user_id == user_id,
+            candidate != user_id,
+            candidate.not_in(friend_ids_query(user_id)),
+            candidate.not_in(pending),
+        )
+        .group_by(candidate)
+        .order_by(func.count().desc(), candidate)
+        .limit(limit)
+        .subquery()
+    )
+
+    rows = db.execute(
+        select(User.id, User.username, ranked.c.mutual_friends)
+        .join(ranked, ranked.c.id == User.id)
+        .order_by(ranked.c.mutual_friends.desc(), User.id)
+    ).all()
+    return [
+        {"id": r.id, "username": r.username, "mutual_friends": r.mutual_friends}
+        for r in rows
+    ]
+
+
+def backfill_friendships(conn: Connection) -> int:
+    """
+    Add both directions of every accepted friend request to friendships, for
+    databases from before the adjacency table was kept up to date. Insert-only
+    (pairs that exist are left alone, so friendships made through /friends/add
+    survive) and idempotent, so it runs at every startup. Needs the unique
+    index from ensure_unique_index. Returns the number of rows added.
+    """
+    insert_ = postgresql.insert if conn.dialect.name == "postgresql" else sqlite.insert
+    accepted = FriendRequest.status == "accepted"
+    added = 0
+    for user_col, friend_col in (
+        (FriendRequest.from_user_id, FriendRequest.to_user_id),
+        (FriendRequest.to_user_id, FriendRequest.from_user_id),
+    ):
+        result = conn.execute(
+            insert_(friendships)
+            .from_select(["user_id", "friend_id"], select(user_col, friend_col).where(accepted))
+            .on_conflict_do_nothing(index_elements=["user_id", "friend_id"])
+        )
+        added += max(result.rowcount, 0)
+    if added:
+        conn.execute(update(User).values(friend_count=_friend_count()))
+    return added
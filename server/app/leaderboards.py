@@ -0,0 +1,303 @@
+import bisect
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models import CollectionVersion, Quest
+from .versions import on_bump
+
+
+logger = logging.getLogger(__name__)
+
+
+# Leaderboard periods and how far back each one reaches (None = no cutoff).
+PERIOD_DAYS = {"week": 7, "month": 30, "all": None}
+
+# Columns every leaderboard entry is built from.
+_COLUMNS = (Quest.id, Quest.title, Quest.icon, Quest.votes, Quest.created_at)
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    if value is None:
+        return None
+    # SQLite hands back naive datetimes; they are UTC (server_default=now()).
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _entry(row) -> dict:
+    return {
+        "title": row.title,
+        "icon": row.icon,
+        "votes": row.votes or 0,
+        "created_at": row.created_at,
+    }
+
+
+class _Board:
+    """
+    Quest ids kept sorted by (votes, id), read from the end so the order is
+    votes desc, id desc (the same as /quests/with_votes). A min-heap on
+    created_at lets quests which fell out of the period be dropped without scanning.
+    """
+
+    def __init__(self, days: int | None):
+        self.days = days
+        self.keys: list[tuple[int, str]] = []
+        self.expiry: list[tuple[datetime, str]] = []
+
+    @classmethod
+    def build(cls, days: int | None, entries: dict, now: datetime) -> "_Board":
+        """
+        Board for every entry in the period, sorted once (not one insort per quest).
+        """
+        board = cls(days)
+        if days is None:
+            board.keys = sorted((e["votes"], quest_id) for quest_id, e in entries.items())
+            return board
+        cutoff = now - timedelta(days=days)
+        recent = [
+            (quest_id, e["votes"], _as_utc(e["created_at"]))
+            for quest_id, e in entries.items()
+            if e["created_at"] is not None and _as_utc(e["created_at"]) >= cutoff
+        ]
+        board.keys = sorted((votes, quest_id) for quest_id, votes, _ in recent)
+        board.expiry = [(created_at, quest_id) for quest_id, _, created_at in recent]
+        heapq.heapify(board.expiry)
+        return board
+
+    def add(self, quest_id: str, votes: int, created_at: datetime | None) -> None:
+        if self.days is not None:
+            if created_at is None:
+                return
+            heapq.heappush(self.expiry, (created_at, quest_id))
+        bisect.insort(self.keys, (votes, quest_id))
+
+    def remove(self, quest_id: str, votes: int) -> bool:
+        key = (votes, quest_id)
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+            return True
+        return False
+
+    def move(self, quest_id: str, old_votes: int, votes: int) -> None:
+        # Quests that are not (or no longer) in a period stay out of it.
+        if self.remove(quest_id, old_votes):
+            bisect.insort(self.keys, (votes, quest_id))
+
+    def expire(self, now: datetime, entries: dict) -> None:
+        if self.days is None:
+            return
+        cutoff = now - timedelta(days=self.days)
+        while self.expiry and self.expiry[0][0] < cutoff:
+            created_at, quest_id = heapq.heappop(self.expiry)
+            entry = entries.get(quest_id)
+            # Skip heap entries left behind by a changed created_at.
+            if entry is not None and _as_utc(entry["created_at"]) == created_at:
+                self.remove(quest_id, entry["votes"])
+
+
+class QuestLeaderboard:
+    """
+    In-process, incrementally maintained "top quests by votes" for each period.
+
+    Reads return a slice of an already sorted list instead of sorting the quests
+    table. create_quest and the vote routes push changes in with add() / update(),
+    and this worker's bumps of the "quests" version are recorded (note_bump) so
+    they do not look like someone else's write. Each worker process keeps its own
+    copy: at most every `sync_seconds` it checks the "quests" version and, if
+    another worker moved it, reads just the quests whose updated_at is recent.
+    The full table is only read at startup and every `refresh_seconds`, on a
+    background thread.
+    """
+
+    # Re-read changes this far back from the last sync: a write's updated_at is
+    # its transaction's start, and its version bump may come a little later.
+    sync_overlap = timedelta(seconds=10)
+
+    def __init__(self, refresh_seconds: float = 300, sync_seconds: float = 2):
+        self.refresh_seconds = refresh_seconds
+        self.sync_seconds = sync_seconds
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        self._boards: dict[str, _Board] = {}
+        self._loaded_at: float | None = None
+        self._rebuilding = False
+        self._checked_at = 0.0
+        self._version: int | None = None
+        # Database time the last rebuild / sync read up to.
+        self._synced_until: datetime | None = None
+        # Changes whenever the boards do; part of the GET /quests/ ETag and cache key.
+        self.generation = 0
+
+    def _changed(self) -> None:
+        self.generation = max(time.time_ns(), self.generation + 1)
+
+    @staticmethod
+    def _quests_version(db: Session) -> int | None:
+        return db.query(CollectionVersion.version).filter(CollectionVersion.name == "quests").scalar()
+
+    @staticmethod
+    def _db_now(db: Session) -> datetime | None:
+        return _as_utc(db.execute(select(func.now())).scalar())
+
+    def rebuild(self, db: Session) -> None:
+        """
+        Reload every quest. Runs at startup and then every `refresh_seconds` in
+        the background; requests never wait for it once the board is loaded.
+        """
+        # Read the version and clock first: a write that lands during the
+        # rebuild is picked up by the next sync.
+        version = self._quests_version(db)
+        synced_until = self._db_now(db)
+        entries = {r.id: _entry(r) for r in db.query(*_COLUMNS).all()}
+        now = datetime.now(timezone.utc)
+        boards = {period: _Board.build(days, entries, now) for period, days in PERIOD_DAYS.items()}
+        with self._lock:
+            self._entries = entries
+            self._boards = boards
+            self._loaded_at = self._checked_at = time.monotonic()
+            self._version = version
+            self._synced_until = synced_until
+            self._changed()
+
+    def _rebuild_in_background(self) -> None:
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def run():
+            db = SessionLocal()
+            try:
+                self.rebuild(db)
+            except Exception:
+                logger.exception("Leaderboard rebuild failed")
+            finally:
+                db.close()
+                self._rebuilding = False
+
+        threading.Thread(target=run, name="leaderboard-rebuild", daemon=True).start()
+
+    def sync(self, db: Session) -> None:
+        """
+        Apply quests changed by other workers since the last sync (by updated_at),
+        if the "quests" version says there are any.
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            return  # another request is already syncing
+        try:
+            version = self._quests_version(db)
+            if version == self._version:
+                return
+            synced_until = self._db_now(db)
+            query = db.query(*_COLUMNS)
+            if self._synced_until is not None:
+                query = query.filter(Quest.updated_at >= self._synced_until - self.sync_overlap)
+            else:
+                query = query.filter(Quest.updated_at.isnot(None))
+            rows = query.all()
+            with self._lock:
+                changed = False
+                for row in rows:
+                    changed |= self._apply(row.id, _entry(row))
+                if changed:
+                    self._changed()
+                if self._version is None or (version is not None and version > self._version):
+                    self._version = version
+                self._synced_until = synced_until
+        finally:
+            self._sync_lock.release()
+
+    def _apply(self, quest_id: str, entry: dict) -> bool:
+        """
+        Insert or update one quest on every board. Call with the lock held.
+        """
+        old = self._entries.get(quest_id)
+        if old == entry:
+            return False
+        if old is None or old["created_at"] != entry["created_at"]:
+            for board in self._boards.values():
+                if old is not None:
+                    board.remove(quest_id, old["votes"])
+                board.add(quest_id, entry["votes"], _as_utc(entry["created_at"]))
+        elif old["votes"] != entry["votes"]:
+            for board in self._boards.values():
+                board.move(quest_id, old["votes"], entry["votes"])
+        self._entries[quest_id] = entry
+        return True
+
+    def refresh_if_stale(self, db: Session) -> None:
+        if self._loaded_at is None:
+            self.rebuild(db)  # first use only; normally loaded at startup
+            return
+        if time.monotonic() - self._loaded_at > self.refresh_seconds:
+            self._rebuild_in_background()
+        now = time.monotonic()
+        if now - self._checked_at < self.sync_seconds:
+            return
+        self._checked_at = now
+        self.sync(db)
+
+    def note_bump(self, versions: dict[str, int]) -> None:
+        """
+        on_bump listener: a "quests" bump by this worker that lands exactly one
+        past the version we have seen only covers writes already applied here.
+        Anything else is left for sync().
+        """
+        version = versions.get("quests")
+        with self._lock:
+            if version is not None and self._version is not None and version == self._version + 1:
+                self._version = version
+
+    def top(self, db: Session, period: str, limit: int | None = None, offset: int = 0) -> list[dict]:
+        """
+        Quests for `period` ("week" | "month" | "all"; anything else means "all"),
+        ordered by votes then id, both descending, as dicts with
+        id/title/icon/votes/created_at. limit=None returns every quest from `offset` on.
+        """
+        self.refresh_if_stale(db)
+        if period not in PERIOD_DAYS:
+            period = "all"
+        with self._lock:
+            board = self._boards[period]
+            board.expire(datetime.now(timezone.utc), self._entries)
+            end = len(board.keys) - offset
+            start = 0 if limit is None else max(0, end - limit)
+            page = board.keys[start:max(0, end)][::-1]
+            return [{"id": quest_id, **self._entries[quest_id]} for _, quest_id in page]
+
+    def add(self, quest: Quest) -> None:
+        with self._lock:
+            if self._loaded_at is None or quest.id in self._entries:
+                return
+            self._apply(quest.id, _entry(quest))
+            self._changed()
+
+    def update(self, quest_id: str, votes: int) -> None:
+        """
+        Record a quest's new vote total (after the vote has been committed).
+        """
+        with self._lock:
+            entry = self._entries.get(quest_id)
+            if entry is None or entry["votes"] == votes:
+                return
+            self._apply(quest_id, {**entry, "votes": votes})
+            self._changed()
+
+
+# - LEADERBOARD_REFRESH_SECONDS (optional, default 300)
+# - LEADERBOARD_SYNC_SECONDS (optional, default 2; how often to check for other workers' writes)
+quest_leaderboard = QuestLeaderboard(
+    refresh_seconds=float(os.getenv("LEADERBOARD_REFRESH_SECONDS", "300")),
+    sync_seconds=float(os.getenv("LEADERBOARD_SYNC_SECONDS", "2")),
+)
+on_bump(quest_leaderboard.note_bump)
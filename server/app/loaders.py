@@ -0,0 +1,18 @@
+from typing import Iterable
+
+from sqlalchemy.orm import Session
+
+
+def load_by_ids(db: Session, model, ids: Iterable[str | None]) -> dict:
+    """
+    Fetch every `model` row whose id is in `ids` with a single query.
+
+    Returns a dict of id -> row so list endpoints can attach related rows
+    (quest, poster, commenter, ...) without one db.get() per item.
+    None ids are skipped and duplicates are only fetched once.
+    """
+    unique_ids = {i for i in ids if i is not None}
+    if not unique_ids:
+        return {}
+    rows = db.query(model).filter(model.id.in_(unique_ids)).all()
+    return {row.id: row for row in rows}
@@ -2,13 +2,23 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from sqlalchemy import text
 
-from .database import Base, engine
-from .routes import auth, friends, quests, share, posts, users
+from .database import Base, SessionLocal, engine
+from .events import event_broker
+from .friendships import backfill_friendships, ensure_unique_index
+from .leaderboards import quest_leaderboard
+from .pagination import NEXT_CURSOR_HEADER
+from .response_cache import quest_list_cache
+from .singleflight import posts_flight, quests_flight
+from .storage import InvalidObjectKey, StorageError, StorageNotConfigured
+from .url_cache import signed_url_cache
+from .versions import COLLECTIONS, bump
+from .routes import auth, events, friends, quests, share, posts, users, votes
 
 
 app = FastAPI()
@@ -19,23 +29,86 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Last-Modified"],
 )
 
 
+@app.exception_handler(StorageError)
+async def storage_error(request: Request, exc: StorageError):
+    """
+    Storage backends raise StorageError instead of HTTPException; map it here.
+    """
+    if isinstance(exc, StorageNotConfigured):
+        status_code = 500
+    elif isinstance(exc, InvalidObjectKey):
+        status_code = 400
+    else:
+        status_code = 502
+    return JSONResponse(status_code=status_code, content={"detail": str(exc)})
+
+
+# Lightweight "migrations" for local/dev. SQLAlchemy create_all() will NOT add new
+# columns or indexes to existing tables, so each statement is tried once per startup
+# and any error (already exists / unsupported syntax) is ignored.
+STARTUP_MIGRATIONS = [
+    "ALTER TABLE users ADD COLUMN pfp_key VARCHAR",
+    "ALTER TABLE users ADD COLUMN pfp_variants JSON",
+    "ALTER TABLE posts ADD COLUMN media_variants JSON",
+    "CREATE INDEX IF NOT EXISTS ix_posts_created_at_id ON posts (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_posts_votes ON posts (votes)",
+    "CREATE INDEX IF NOT EXISTS ix_quests_votes_id ON quests (votes, id)",
+    "CREATE INDEX IF NOT EXISTS ix_quests_created_at ON quests (created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_quests_coalesced_votes_id ON quests ((coalesce(votes, 0)), id)",
+    "ALTER TABLE quests ADD COLUMN received_count INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE quests ADD COLUMN completed_count INTEGER NOT NULL DEFAULT 0",
+    "CREATE INDEX IF NOT EXISTS ix_received_quests_user_id ON received_quests (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_received_quests_quest_id ON received_quests (quest_id)",
+    "CREATE INDEX IF NOT EXISTS ix_completed_quests_user_id ON completed_quests (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_completed_quests_quest_id ON completed_quests (quest_id)",
+    "CREATE INDEX IF NOT EXISTS ix_friend_requests_from_to ON friend_requests (from_user_id, to_user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_friend_requests_to_status ON friend_requests (to_user_id, status)",
+    "ALTER TABLE users ADD COLUMN friend_count INTEGER NOT NULL DEFAULT 0",
+    "CREATE INDEX IF NOT EXISTS ix_posts_user_created_at ON posts (user_id, created_at, id)",
+    "ALTER TABLE posts ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0",
+    # Left NULL on existing rows: their vote history may predate quest_votes / post_votes.
+    "ALTER TABLE quests ADD COLUMN vote_offset INTEGER",
+    "ALTER TABLE posts ADD COLUMN vote_offset INTEGER",
+    "CREATE INDEX IF NOT EXISTS ix_post_comments_post_created ON post_comments (post_id, created_at, id)",
+    "ALTER TABLE quests ADD COLUMN updated_at TIMESTAMP WITH TIME ZONE",
+    "CREATE INDEX IF NOT EXISTS ix_quests_updated_at ON quests (updated_at)",
+    # One row per collection in app/versions.py (a duplicate insert just fails).
+    *(
+        f"INSERT INTO collection_versions (name, version) VALUES ('{name}', 0)"
+        for name in COLLECTIONS
+    ),
+]
+
+
 @app.on_event("startup")
 def on_startup():
     Base.metadata.create_all(bind=engine)
-    # Lightweight "migration" for local/dev: ensure users.pfp_key exists.
-    # SQLAlchemy create_all() will NOT add new columns to existing tables.
+    for statement in STARTUP_MIGRATIONS:
+        try:
+            # One transaction per statement: a failure must not abort the others.
+            with engine.begin() as conn:
+                conn.execute(text(statement))
+        except Exception:
+            # Some DBs (like SQLite) don't support IF NOT EXISTS on ALTER TABLE, so we
+            # just try and ignore the error – we only need it to succeed once.
+            pass
+    # Not plain migrations: they have to clean up / fill in existing data, and
+    # must not fail silently.
+    with engine.begin() as conn:
+        ensure_unique_index(conn)
+        backfilled = backfill_friendships(conn)
+    if backfilled:
+        bump("friendships")
+    # Load the leaderboard now rather than in the first GET /quests/.
+    db = SessionLocal()
     try:
-        with engine.begin() as conn:
-            # Some DBs (like SQLite) don't support IF NOT EXISTS here, so we just
-            # try to add the column and ignore the error if it already exists.
-            conn.execute(text("ALTER TABLE users ADD COLUMN pfp_key VARCHAR"))
-    except Exception:
-        # If the column already exists or the DB doesn't support this exact syntax,
-        # just ignore the error – we only need it to succeed once.
-        pass
+        quest_leaderboard.rebuild(db)
+    finally:
+        db.close()
 
 
 app.include_router(auth.router)
@@ -44,4 +117,20 @@ app.include_router(friends.router)
 app.include_router(share.router)
 app.include_router(posts.router)
 app.include_router(users.router)
+app.include_router(votes.router)
+app.include_router(events.router)
+
 
+@app.get("/stats")
+def stats():
+    """
+    In-process cache, request-coalescing and event-stream counters for this worker.
+    """
+    return {
+        "signed_url_cache": signed_url_cache.stats(),
+        "quest_list_cache": quest_list_cache.stats(),
+        "single_flight": {
+            flight.name: flight.stats() for flight in (quests_flight, posts_flight)
+        },
+        "event_streams": event_broker.stats(),
+    }
@@ -1,10 +1,17 @@
-from sqlalchemy import Table, Column, String, Integer, ForeignKey, DateTime, UniqueConstraint
+from sqlalchemy import Table, Column, String, Integer, ForeignKey, DateTime, UniqueConstraint, Index, JSON
 from sqlalchemy.orm import relationship, declarative_base
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from .database import Base
+from datetime import datetime, timezone
 import uuid
 
 
+def _utcnow() -> datetime:
+    # Set in Python for columns used in keyset cursors: SQLite's CURRENT_TIMESTAMP
+    # has whole seconds, so rows would not compare equal to their own cursor.
+    return datetime.now(timezone.utc)
+
+
 class FriendRequest(Base):
     __tablename__ = "friend_requests"
 
@@ -13,6 +20,11 @@ class FriendRequest(Base):
     to_user_id = Column(String, ForeignKey("users.id"))
     status = Column(String, default="pending")  # pending | accepted | rejected
 
+    __table_args__ = (
+        Index("ix_friend_requests_from_to", "from_user_id", "to_user_id"),
+        Index("ix_friend_requests_to_status", "to_user_id", "status"),
+    )
+
 class User(Base):
     __tablename__ = "users"
 
@@ -21,18 +33,39 @@ class User(Base):
     password = Column(String)
     # Cloudflare R2 profile picture object key (used to derive signed URL)
     pfp_key = Column(String, nullable=True)
+    # Resized copies of pfp_key: {"<width>": "<object key>"}; filled in the background.
+    pfp_variants = Column(JSON, nullable=True)
+    # Number of friendships rows for this user; kept in step by app/friendships.py.
+    friend_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     quests = relationship("Quest", back_populates="creator")
 
 
 class Quest(Base):
     __tablename__ = "quests"
+    __table_args__ = (
+        # /quests/with_votes: keyset pagination on (coalesce(votes, 0), id), period filter on created_at.
+        Index("ix_quests_votes_id", "votes", "id"),
+        Index("ix_quests_coalesced_votes_id", text("coalesce(votes, 0)"), "id"),
+        Index("ix_quests_created_at", "created_at"),
+        # Leaderboard sync: quests changed since the last check (app/leaderboards.py).
+        Index("ix_quests_updated_at", "updated_at"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     title = Column(String)
     icon = Column(String)
     votes = Column(Integer, default=0)
+    # Part of `votes` not backed by quest_votes rows (votes cast before those were
+    # recorded). NULL = not measured yet; see app/votes.py reconcile_vote_totals.
+    vote_offset = Column(Integer, nullable=True, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Database clock, so every worker compares against the same time. NULL on
+    # rows that have not changed since the column was added.
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # Maintained by share_quest / complete_quest; used for the difficulty (completion rate).
+    received_count = Column(Integer, nullable=False, default=0, server_default="0")
+    completed_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     creator_id = Column(String, ForeignKey("users.id"))
     creator = relationship("User", back_populates="quests")
@@ -50,11 +83,29 @@ class QuestVote(Base):
     value = Column(Integer, nullable=False)  # -1 or 1 (0 represented by deleting row)
 
 
+# Accepted friendships, one row per direction (A->B and B->A), so "friends of X"
+# is a range scan on ix_friendships_user_friend. Maintained by app/friendships.py.
 friendships = Table(
     "friendships",
     Base.metadata,
     Column("user_id", String, ForeignKey("users.id")),
     Column("friend_id", String, ForeignKey("users.id")),
+    Index("ix_friendships_user_friend", "user_id", "friend_id", unique=True),
+)
+
+
+# Per-user friends timeline ("inbox"): one row per (reader, friend's post), written
+# when the post is created. created_at is copied from the post so a page is a
+# range scan on ix_timeline_entries_user_created. Maintained by app/timeline.py.
+timeline_entries = Table(
+    "timeline_entries",
+    Base.metadata,
+    Column("user_id", String, ForeignKey("users.id"), primary_key=True),
+    Column("post_id", String, ForeignKey("posts.id"), primary_key=True),
+    Column("author_id", String, ForeignKey("users.id"), nullable=False),
+    Column("created_at", DateTime(timezone=True)),
+    Index("ix_timeline_entries_user_created", "user_id", "created_at", "post_id"),
+    Index("ix_timeline_entries_post_id", "post_id"),
 )
 
 
@@ -62,8 +113,8 @@ class ReceivedQuest(Base):
     __tablename__ = "received_quests"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("users.id"))
-    quest_id = Column(String, ForeignKey("quests.id"))
+    user_id = Column(String, ForeignKey("users.id"), index=True)
+    quest_id = Column(String, ForeignKey("quests.id"), index=True)
     status = Column(String, default="received")  # received | completed
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -72,20 +123,33 @@ class CompletedQuest(Base):
     __tablename__ = "completed_quests"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("users.id"))
-    quest_id = Column(String, ForeignKey("quests.id"))
+    user_id = Column(String, ForeignKey("users.id"), index=True)
+    quest_id = Column(String, ForeignKey("quests.id"), index=True)
 
 
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        # Feed queries: keyset pagination on (created_at, id) and top-N by votes.
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        Index("ix_posts_votes", "votes"),
+        # Friends timeline: fan-out-on-read for authors with many friends.
+        Index("ix_posts_user_created_at", "user_id", "created_at", "id"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     quest_id = Column(String, ForeignKey("quests.id"), nullable=False)
     user_id = Column(String, ForeignKey("users.id"), nullable=True)
     media_url = Column(String, nullable=False)
     media_type = Column(String, nullable=False)  # "image" | "video"
+    # Resized copies of media_url for images: {"<width>": "<object key>"}; filled in the background.
+    media_variants = Column(JSON, nullable=True)
     votes = Column(Integer, default=0)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Same as Quest.vote_offset, for post_votes.
+    vote_offset = Column(Integer, nullable=True, default=0)
+    # Maintained by create_comment; shown in the feed without counting per post.
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime(timezone=True), default=_utcnow, server_default=func.now())
 
     quest = relationship("Quest")
 
@@ -105,9 +169,25 @@ class PostVote(Base):
 
 class PostComment(Base):
     __tablename__ = "post_comments"
+    __table_args__ = (
+        # Comments on a post, keyset-paginated on (created_at, id).
+        Index("ix_post_comments_post_created", "post_id", "created_at", "id"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     post_id = Column(String, ForeignKey("posts.id"), nullable=False)
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
     content = Column(String, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), default=_utcnow, server_default=func.now())
+
+
+class CollectionVersion(Base):
+    """
+    Change counter per collection ("quests", "posts", ...), bumped in the same
+    transaction as every write to it. Used as the ETag validator for list endpoints.
+    """
+    __tablename__ = "collection_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
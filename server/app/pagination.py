@@ -0,0 +1,30 @@
+import base64
+
+from fastapi import HTTPException
+
+
+# Keyset pagination helpers. List endpoints return the cursor for the next page
+# in this response header (absent on the last page).
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*parts) -> str:
+    """
+    Opaque cursor for a keyset position, e.g. encode_cursor(created_at.isoformat(), id).
+    """
+    raw = "|".join(str(p) for p in parts)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, count: int) -> list[str]:
+    """
+    Split a cursor from encode_cursor back into its `count` string parts.
+    The last part may itself contain "|".
+    """
+    try:
+        parts = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", count - 1)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if len(parts) != count:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return parts
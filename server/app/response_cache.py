@@ -0,0 +1,112 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """
+    Per-process key/value store with expiry. Invalidations only reach the
+    worker that made them; the TTL bounds how stale other workers can be.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key: str) -> None:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+
+class ResponseCache:
+    """
+    Pre-encoded response bodies for one endpoint, keyed by request parameters.
+
+    Entries live for `ttl` seconds. invalidate() bumps a generation counter that
+    is part of every key, so all cached variants are dropped at once without
+    having to enumerate them. Backend errors are logged and treated as misses:
+    the cache never fails a request.
+    """
+
+    def __init__(self, namespace: str, ttl: float, backend):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, params: tuple) -> str:
+        generation = self.backend.counter(f"{self.namespace}:gen")
+        return f"{self.namespace}:{generation}:" + ":".join(str(p) for p in params)
+
+    def get(self, *params) -> bytes | None:
+        if self.ttl <= 0:
+            return None
+        try:
+            body = self.backend.get(self._key(params))
+        except Exception:
+            logger.exception("Response cache read failed (%s)", self.namespace)
+            body = None
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body
+
+    def set(self, body: bytes, *params) -> None:
+        if self.ttl <= 0:
+            return
+        try:
+            self.backend.set(self._key(params), body, self.ttl)
+        except Exception:
+            logger.exception("Response cache write failed (%s)", self.namespace)
+
+    def invalidate(self) -> None:
+        try:
+            self.backend.incr(f"{self.namespace}:gen")
+        except Exception:
+            logger.exception("Response cache invalidation failed (%s)", self.namespace)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+# Anonymous GET /quests/ (same body for every caller), invalidated by quest creates and votes.
+# The bodies are built from this worker's in-memory leaderboard, so they are
+# never shared with other workers: one with a stale leaderboard would publish
+# its stale listing to all of them.
+# - QUEST_LIST_CACHE_TTL_SECONDS (optional, default 10; 0 disables)
+quest_list_cache = ResponseCache(
+    "quests:list",
+    ttl=float(os.getenv("QUEST_LIST_CACHE_TTL_SECONDS", "10")),
+    backend=MemoryBackend(),
+)
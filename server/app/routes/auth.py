@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from ..database import SessionLocal
+from ..executors import password_executor, run_blocking
 from ..models import User
 from ..schemas import UserCreate
-from ..security import hash_password, verify_password, create_token
+from ..security import hash_password, verify_and_update, create_token
 
 router = APIRouter(prefix="/auth")
 
@@ -15,13 +17,14 @@ def get_db():
     finally:
         db.close()
 
-@router.post("/signup")
-def signup(data: UserCreate, db: Session = Depends(get_db)):
-    existing = db.query(User).filter(User.username == data.username).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="USERNAME_TAKEN")
+# signup / login are async so bcrypt can run on the bounded password executor;
+# their DB work goes through run_in_threadpool to stay off the event loop.
 
-    user = User(username=data.username, password=hash_password(data.password))
+def _find_user(db: Session, username: str) -> User | None:
+    return db.query(User).filter(User.username == username).first()
+
+def _create_user(db: Session, username: str, hashed: str) -> User:
+    user = User(username=username, password=hashed)
     db.add(user)
     try:
         db.commit()
@@ -30,6 +33,20 @@ def signup(data: UserCreate, db: Session = Depends(get_db)):
         # Handle race condition where username was taken after the check.
         raise HTTPException(status_code=400, detail="USERNAME_TAKEN")
     db.refresh(user)
+    return user
+
+def _update_password(db: Session, user: User, hashed: str) -> None:
+    user.password = hashed
+    db.commit()
+
+@router.post("/signup")
+async def signup(data: UserCreate, db: Session = Depends(get_db)):
+    existing = await run_in_threadpool(_find_user, db, data.username)
+    if existing:
+        raise HTTPException(status_code=400, detail="USERNAME_TAKEN")
+
+    hashed = await run_blocking(password_executor, hash_password, data.password)
+    user = await run_in_threadpool(_create_user, db, data.username, hashed)
 
     return {
         "token": create_token(user.id),
@@ -40,10 +57,19 @@ def signup(data: UserCreate, db: Session = Depends(get_db)):
     }
 
 @router.post("/login")
-def login(data: UserCreate, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == data.username).first()
-    if not user or not verify_password(data.password, user.password):
+async def login(data: UserCreate, db: Session = Depends(get_db)):
+    user = await run_in_threadpool(_find_user, db, data.username)
+    if not user or not user.password:
+        raise HTTPException(status_code=401)
+
+    ok, new_hash = await run_blocking(
+        password_executor, verify_and_update, data.password, user.password
+    )
+    if not ok:
         raise HTTPException(status_code=401)
+    if new_hash:
+        # Transparently move older hashes to the current scheme.
+        await run_in_threadpool(_update_password, db, user, new_hash)
 
     return {
         "token": create_token(user.id),
@@ -0,0 +1,58 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from ..events import EVENTS_HEARTBEAT_SECONDS, TooManyConnections, event_broker
+from ..security import STREAM_TOKEN_SECONDS, create_stream_token, get_current_user_id, get_stream_user_id
+
+
+router = APIRouter(prefix="/events")
+
+
+@router.post("/token")
+def stream_token(user_id: str = Depends(get_current_user_id)):
+    """
+    Short-lived token for GET /events/?token=..., for EventSource, which cannot
+    send an Authorization header. Fetch a new one for every (re)connect.
+    """
+    return {"token": create_stream_token(user_id), "expires_in": STREAM_TOKEN_SECONDS}
+
+
+@router.get("/")
+async def stream_events(
+    request: Request,
+    user_id: str = Depends(get_stream_user_id),
+):
+    """
+    Server-sent event stream for the current user: post_vote, quest_vote,
+    comment, friend_request and quest_shared. Events are not replayed; after a
+    reconnect the client should re-fetch what it shows.
+    """
+    try:
+        sub = event_broker.subscribe(user_id)
+    except TooManyConnections as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    async def body():
+        try:
+            yield b": connected\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(sub.queue.get(), EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": ping\n\n"
+                    continue
+                if message is None:  # fell too far behind; the client reconnects
+                    break
+                yield message
+        finally:
+            event_broker.unsubscribe(sub)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,8 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from ..database import SessionLocal
-from ..models import User, friendships, FriendRequest
+from ..events import event_broker
+from ..friendships import (
+    add_friendship,
+    friend_ids_query,
+    remove_friendship,
+    suggest_friends,
+)
+from ..loaders import load_by_ids
+from ..models import User, FriendRequest
 from ..security import get_current_user_id
+from ..versions import bump
 
 router = APIRouter(prefix="/friends")
 
@@ -14,16 +23,18 @@ def get_db():
         db.close()
 
 @router.post("/add")
-def add_friend(username: str, current_user_id: str, db: Session = Depends(get_db)):
+def add_friend(
+    username: str,
+    db: Session = Depends(get_db),
+    current_user_id: str = Depends(get_current_user_id),
+):
     friend = db.query(User).filter(User.username == username).first()
     if not friend:
         return {"error": "User not found"}
 
-    db.execute(friendships.insert().values(
-        user_id=current_user_id,
-        friend_id=friend.id
-    ))
+    add_friendship(db, current_user_id, friend.id)
     db.commit()
+    bump("friendships")
     return {"ok": True}
 
 @router.post("/request")
@@ -56,6 +67,13 @@ def send_request(
 
     db.add(fr)
     db.commit()
+
+    sender = db.get(User, user_id)
+    event_broker.publish(
+        [target.id],
+        "friend_request",
+        {"id": fr.id, "from_user_id": user_id, "from_username": sender.username if sender else None},
+    )
     return {"ok": True}
 
 @router.get("/incoming")
@@ -73,23 +91,15 @@ def incoming_requests(
     )
 
     # Map from_user_id -> username so the frontend can show names instead of raw IDs.
-    from_user_ids = [r.from_user_id for r in requests]
-    users = (
-        db.query(User)
-        .filter(User.id.in_(from_user_ids))
-        .all()
-        if from_user_ids
-        else []
-    )
-    user_map = {u.id: u.username for u in users}
+    user_map = load_by_ids(db, User, [r.from_user_id for r in requests])
 
     return [
         {
             "id": r.id,
             "from_user_id": r.from_user_id,
             "from_username": (
-                db.get(User, r.from_user_id).username
-                if db.get(User, r.from_user_id)
+                user_map[r.from_user_id].username
+                if r.from_user_id in user_map
                 else None
             ),
         }
@@ -108,36 +118,33 @@ def respond_request(
     if not fr or fr.to_user_id != user_id:
         raise HTTPException(404)
 
+    was_accepted = fr.status == "accepted"
     fr.status = "accepted" if accept else "rejected"
+    if accept:
+        add_friendship(db, fr.from_user_id, fr.to_user_id)
+    elif was_accepted:
+        remove_friendship(db, fr.from_user_id, fr.to_user_id)
     db.commit()
+    if accept or was_accepted:
+        bump("friendships")
 
     return {"status": fr.status}
 
+def _friends_of(db: Session, user_id: str) -> list[dict]:
+    friends = (
+        db.query(User.id, User.username)
+        .filter(User.id.in_(friend_ids_query(user_id)))
+        .all()
+    )
+    return [{"id": f.id, "username": f.username} for f in friends]
+
+
 @router.get("/list")
 def list_friends(
     db: Session = Depends(get_db),
     user_id: str = Depends(get_current_user_id),
 ):
-    accepted = (
-        db.query(FriendRequest)
-        .filter(
-            (
-                (FriendRequest.from_user_id == user_id) |
-                (FriendRequest.to_user_id == user_id)
-            ),
-            FriendRequest.status == "accepted"
-        )
-        .all()
-    )
-
-    friend_ids = [
-        r.from_user_id if r.to_user_id == user_id else r.to_user_id
-        for r in accepted
-    ]
-
-    friends = db.query(User).filter(User.id.in_(friend_ids)).all()
-
-    return [{"id": f.id, "username": f.username} for f in friends]
+    return _friends_of(db, user_id)
 
 
 @router.get("/list/by-username/{username}")
@@ -153,22 +160,19 @@ def list_friends_by_username(
     if not u:
         raise HTTPException(404, "User not found")
 
-    accepted = (
-        db.query(FriendRequest)
-        .filter(
-            ((FriendRequest.from_user_id == u.id) | (FriendRequest.to_user_id == u.id)),
-            FriendRequest.status == "accepted",
-        )
-        .all()
-    )
+    return _friends_of(db, u.id)
 
-    friend_ids = [
-        r.from_user_id if r.to_user_id == u.id else r.to_user_id
-        for r in accepted
-    ]
 
-    friends = db.query(User).filter(User.id.in_(friend_ids)).all()
-    return [{"id": f.id, "username": f.username} for f in friends]
+@router.get("/suggestions")
+def friend_suggestions(
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    user_id: str = Depends(get_current_user_id),
+):
+    """
+    People the current user may know, ranked by number of mutual friends.
+    """
+    return suggest_friends(db, user_id, limit)
 
 
 @router.post("/{friend_id}/remove")
@@ -178,9 +182,10 @@ def remove_friend(
     user_id: str = Depends(get_current_user_id),
 ):
     """
-    Remove a friend by marking any accepted FriendRequest between the two users as rejected.
-    This keeps the simple 'accepted' status model used by list_friends.
+    Remove a friend: drop both friendships rows and mark any accepted
+    FriendRequest between the two users as rejected.
     """
+    removed = remove_friendship(db, user_id, friend_id)
     requests = (
         db.query(FriendRequest)
         .filter(
@@ -195,12 +200,12 @@ def remove_friend(
         .all()
     )
 
-    if not requests:
+    if not removed and not requests:
         raise HTTPException(404, "Friend relationship not found")
 
     for r in requests:
         r.status = "rejected"
     db.commit()
+    bump("friendships")
 
     return {"ok": True}
-
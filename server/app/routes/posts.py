@@ -1,54 +1,60 @@
 import os
 import uuid
+from datetime import datetime
 
-import boto3
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Request, Response
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
 
 from ..database import SessionLocal
+from ..events import event_broker
+from ..derivatives import POST_DISPLAY_WIDTH, pick_variant, schedule_post_derivatives
+from ..executors import run_blocking, upload_executor
+from ..fastjson import list_response
+from ..loaders import load_by_ids
 from ..models import Post, Quest, PostComment, User, PostVote
+from ..pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
 from ..routes.users import _signed_pfp_url
-from ..schemas import PostCreate, PostOut, CommentCreate, CommentOut
-from ..security import get_current_user_id
+from ..schemas import (
+    PostCreate,
+    PostOut,
+    CommentCreate,
+    CommentOut,
+    UploadIntentCreate,
+    UploadIntentOut,
+    UploadFinalize,
+)
+from ..security import Principal, get_current_principal, get_current_user_id
+from ..singleflight import posts_flight
+from ..storage import EmptyUpload, StorageError, UploadTooLarge, get_storage
+from ..timeline import fan_out_post, remove_post, timeline_post_ids
+from ..url_cache import signed_url_cache
+from ..versions import bump, bump_later, not_modified, signed_url_epoch
+from ..votes import InvalidVoteTransition, cast_vote
 
 
 router = APIRouter(prefix="/posts")
 
-def _get_s3_client():
-    r2_account_id = os.getenv("R2_ACCOUNT_ID")
-    r2_access_key_id = os.getenv("R2_ACCESS_KEY_ID")
-    r2_secret_access_key = os.getenv("R2_SECRET_ACCESS_KEY")
-    if not (r2_account_id and r2_access_key_id and r2_secret_access_key):
-        raise HTTPException(status_code=500, detail="R2 credentials not configured on server")
-
-    endpoint_url = f"https://{r2_account_id}.r2.cloudflarestorage.com"
-    return boto3.client(
-        "s3",
-        endpoint_url=endpoint_url,
-        aws_access_key_id=r2_access_key_id,
-        aws_secret_access_key=r2_secret_access_key,
-        region_name="auto",
-    )
-
-
 def _signed_get_url(key: str) -> str:
     """
-    Sign a GET URL for a private R2 object key.
+    Sign a GET URL for a private R2 object key (reused from signed_url_cache while fresh).
     """
     r2_bucket = os.getenv("R2_BUCKET")
     if not r2_bucket:
         raise HTTPException(status_code=500, detail="R2 bucket not configured on server")
 
     expires = int(os.getenv("R2_SIGNED_URL_EXPIRES_SECONDS", "3600"))
-    s3 = _get_s3_client()
-    try:
-        return s3.generate_presigned_url(
-            ClientMethod="get_object",
-            Params={"Bucket": r2_bucket, "Key": key},
-            ExpiresIn=expires,
-        )
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Failed to sign URL: {e}")
+
+    def sign() -> str:
+        storage = get_storage()
+        try:
+            return storage.presign_get(r2_bucket, key, expires)
+        except StorageError:
+            raise  # mapped to a response in main.py
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Failed to sign URL: {e}")
+
+    return signed_url_cache.get_or_sign(r2_bucket, key, expires, sign)
 
 
 def get_db():
@@ -59,19 +65,191 @@ def get_db():
         db.close()
 
 
+def _post_row(
+    p: Post,
+    quest: Quest | None,
+    user: User | None,
+    my_vote: int = 0,
+    width: int = POST_DISPLAY_WIDTH,
+) -> dict:
+    # For private R2, we store the object key in Post.media_url and return a signed URL here,
+    # pointing at the smallest resized variant that is at least `width` px wide when one exists.
+    # Keys in PostOut field order (see list_response).
+    return {
+        "id": p.id,
+        "quest_id": p.quest_id,
+        "media_url": _signed_get_url(pick_variant(p.media_url, p.media_variants, width)),
+        "media_type": p.media_type,
+        "votes": p.votes,
+        "comment_count": p.comment_count or 0,
+        "created_at": p.created_at.isoformat() if p.created_at else None,
+        "quest_title": quest.title if quest else None,
+        "quest_icon": quest.icon if quest else None,
+        "poster_username": user.username if user else None,
+        "poster_pfp_url": _signed_pfp_url(user.pfp_key, user.pfp_variants) if user else None,
+        "my_vote": my_vote,
+    }
+
+
+def _post_out(
+    p: Post,
+    quest: Quest | None,
+    user: User | None,
+    my_vote: int = 0,
+    width: int = POST_DISPLAY_WIDTH,
+) -> PostOut:
+    return PostOut(**_post_row(p, quest, user, my_vote, width))
+
+
+def _save_post(db: Session, quest: Quest, principal: Principal, key: str, media_type: str) -> PostOut:
+    """
+    Insert a post for already uploaded media and return it as PostOut.
+    """
+    post = Post(
+        quest_id=quest.id,
+        user_id=principal.user_id,
+        # Store the R2 object key; serve signed URLs to clients.
+        media_url=key,
+        media_type=media_type,
+    )
+    db.add(post)
+    db.flush()
+    fan_out_post(db, post.id, principal.user(db))
+    db.commit()
+    bump("posts")
+    db.refresh(post)
+
+    r2_bucket = os.getenv("R2_BUCKET")
+    if r2_bucket:
+        schedule_post_derivatives(post.id, r2_bucket, key, media_type)
+
+    return _post_out(post, quest, principal.user(db))
+
+
+def _media_type(content_type: str) -> str:
+    return "video" if content_type.lower().startswith("video/") else "image"
+
+
+def _feed_posts(db: Session, top: int, sample: int) -> list[Post]:
+    """
+    Top `top` posts by votes followed by `sample` random other posts, both picked in SQL.
+    """
+    top_posts = (
+        db.query(Post)
+        .order_by(Post.votes.desc(), Post.created_at.desc())
+        .limit(top)
+        .all()
+        if top
+        else []
+    )
+    random_posts: list[Post] = []
+    if sample:
+        query = db.query(Post)
+        top_ids = [p.id for p in top_posts]
+        if top_ids:
+            query = query.filter(Post.id.notin_(top_ids))
+        random_posts = query.order_by(func.random()).limit(sample).all()
+    return top_posts + random_posts
+
+
+def _decode_time_cursor(cursor: str) -> tuple[datetime, str]:
+    created_at, post_id = decode_cursor(cursor, 2)
+    try:
+        return datetime.fromisoformat(created_at), post_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _recent_posts(db: Session, limit: int, cursor: str | None) -> list[Post]:
+    """
+    Newest-first page of posts, keyset-paginated on (created_at, id).
+    """
+    query = db.query(Post).filter(Post.created_at.isnot(None))
+    if cursor:
+        created_at, post_id = _decode_time_cursor(cursor)
+        query = query.filter(
+            (Post.created_at < created_at)
+            | ((Post.created_at == created_at) & (Post.id < post_id))
+        )
+    return query.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit).all()
+
+
+def _friends_posts(db: Session, user_id: str, limit: int, cursor: str | None) -> list[Post]:
+    """
+    Newest-first page of the user's friends timeline, keyset-paginated on (created_at, id).
+    """
+    page = timeline_post_ids(db, user_id, limit, _decode_time_cursor(cursor) if cursor else None)
+    post_map = load_by_ids(db, Post, [post_id for _, post_id in page])
+    return [post_map[post_id] for _, post_id in page if post_id in post_map]
+
+
 @router.get("/", response_model=list[PostOut])
 def list_posts(
+    request: Request,
+    response: Response,
+    mode: str = Query(
+        "all",
+        description="'all', 'feed' (top + random), 'recent' or 'friends' (both cursor-paginated)",
+    ),
+    top: int = Query(5, ge=0, le=50, description="feed mode: number of top-voted posts"),
+    sample: int = Query(5, ge=0, le=50, description="feed mode: number of random other posts"),
+    limit: int = Query(20, ge=1, le=100, description="recent/friends mode: page size"),
+    cursor: str | None = Query(None, description="recent/friends mode: X-Next-Cursor from the previous page"),
+    width: int = Query(POST_DISPLAY_WIDTH, ge=1, description="Display width (px) used to pick an image variant"),
     db: Session = Depends(get_db),
-    user_id: str = Depends(get_current_user_id),  # noqa: ARG001 - ensure auth
+    user_id: str = Depends(get_current_user_id),
 ):
     """
-    Return all posts with attached quest metadata.
-    Frontend is responsible for selecting top / random subsets.
+    Return posts with attached quest metadata.
+
+    - mode=all: every post, newest first.
+    - mode=feed: the top `top` posts by votes, then `sample` random others.
+    - mode=recent: a page of `limit` posts, newest first. The cursor for the next
+      page is returned in the X-Next-Cursor header (absent on the last page).
+    - mode=friends: like recent, but only posts by the current user's friends,
+      read from their precomputed timeline.
+
+    Every mode but feed (which is random) supports If-None-Match. The ETag covers
+    the current user, since my_vote and the friends timeline are per user.
     """
-    posts = db.query(Post).order_by(Post.created_at.desc()).all()
+    if mode != "feed":
+        collections = ("posts", "users", "friendships") if mode == "friends" else ("posts", "users")
+        unchanged = not_modified(
+            db, request, response, collections,
+            user_id, mode, limit, cursor, width, signed_url_epoch(),
+        )
+        if unchanged is not None:
+            return unchanged
+
+    def compute() -> tuple[list[dict], str | None]:
+        next_cursor = None
+        if mode == "feed":
+            posts = _feed_posts(db, top, sample)
+        elif mode in ("recent", "friends"):
+            if mode == "recent":
+                posts = _recent_posts(db, limit, cursor)
+            else:
+                posts = _friends_posts(db, user_id, limit, cursor)
+            if len(posts) == limit:
+                last = posts[-1]
+                next_cursor = encode_cursor(last.created_at.isoformat(), last.id)
+        else:
+            posts = db.query(Post).order_by(Post.created_at.desc()).all()
+
+        quest_map = load_by_ids(db, Quest, [p.quest_id for p in posts])
+        user_map = load_by_ids(db, User, [p.user_id for p in posts])
+        rows = [_post_row(p, quest_map.get(p.quest_id), user_map.get(p.user_id), 0, width) for p in posts]
+        return rows, next_cursor
+
+    # Identical concurrent requests share one computation; my_vote is filled in per user below.
+    # The friends timeline itself is per user, so it is only shared between that user's requests.
+    key = (mode, top, sample, limit, cursor, width, user_id if mode == "friends" else None)
+    rows, next_cursor = posts_flight.do(key, compute)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
 
     # Load this user's votes for the returned posts in one query
-    post_ids = [p.id for p in posts]
+    post_ids = [r["id"] for r in rows]
     vote_map: dict[str, int] = {}
     if post_ids:
         votes = (
@@ -81,35 +259,14 @@ def list_posts(
         )
         vote_map = {v.post_id: int(v.value) for v in votes}
 
-    results: list[PostOut] = []
-    for p in posts:
-        quest = db.get(Quest, p.quest_id)
-        user = db.get(User, p.user_id) if p.user_id else None
-        # For private R2, we store the object key in Post.media_url and return a signed URL here.
-        signed_url = _signed_get_url(p.media_url)
-        results.append(
-            PostOut(
-                id=p.id,
-                quest_id=p.quest_id,
-                media_url=signed_url,
-                media_type=p.media_type,
-                votes=p.votes,
-                created_at=p.created_at.isoformat() if p.created_at else None,
-                quest_title=quest.title if quest else None,
-                quest_icon=quest.icon if quest else None,
-                poster_username=user.username if user else None,
-                poster_pfp_url=_signed_pfp_url(user.pfp_key) if user else None,
-                my_vote=vote_map.get(p.id, 0),
-            )
-        )
-    return results
+    return list_response([{**r, "my_vote": vote_map.get(r["id"], 0)} for r in rows], response)
 
 
 @router.post("/", response_model=PostOut)
 def create_post(
     data: PostCreate,
     db: Session = Depends(get_db),
-    user_id: str = Depends(get_current_user_id),
+    principal: Principal = Depends(get_current_principal),
 ):
     """
     Create a new post after media has been uploaded to Cloudflare.
@@ -118,32 +275,8 @@ def create_post(
     if not quest:
         raise HTTPException(status_code=404, detail="Quest not found")
 
-    post = Post(
-        quest_id=data.quest_id,
-        user_id=user_id,
-        media_url=data.media_url,
-        media_type=data.media_type,
-    )
-    db.add(post)
-    db.commit()
-    db.refresh(post)
-
     # If client uses this route directly, assume media_url is a key for private R2.
-    signed_url = _signed_get_url(post.media_url)
-    user = db.get(User, user_id)
-    return PostOut(
-        id=post.id,
-        quest_id=post.quest_id,
-        media_url=signed_url,
-        media_type=post.media_type,
-        votes=post.votes,
-        created_at=post.created_at.isoformat() if post.created_at else None,
-        quest_title=quest.title,
-        quest_icon=quest.icon,
-        my_vote=0,
-        poster_username=user.username if user else None,
-        poster_pfp_url=_signed_pfp_url(user.pfp_key) if user else None,
-    )
+    return _save_post(db, quest, principal, data.media_url, data.media_type)
 
 
 @router.post("/upload", response_model=PostOut)
@@ -151,7 +284,7 @@ async def upload_post(
     quest_id: str = Form(...),
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    user_id: str = Depends(get_current_user_id),
+    principal: Principal = Depends(get_current_principal),
 ):
     """
     Browser uploads file to OUR backend (avoids Cloudflare CORS), then backend uploads to Cloudflare R2 (S3 API).
@@ -162,7 +295,16 @@ async def upload_post(
     - R2_SECRET_ACCESS_KEY
     - R2_BUCKET
     - R2_SIGNED_URL_EXPIRES_SECONDS (optional, default 3600)
+    - MAX_UPLOAD_BYTES (optional, default 100 MiB)
+
+    The file is streamed to R2 in UPLOAD_CHUNK_SIZE chunks (multipart for large files),
+    so memory use per upload does not grow with the file size. Storage, DB and signing
+    calls all block, so they run on the upload executor instead of the event loop.
     """
+    return await run_blocking(upload_executor, _upload_post, quest_id, file, db, principal)
+
+
+def _upload_post(quest_id: str, file: UploadFile, db: Session, principal: Principal) -> PostOut:
     quest = db.get(Quest, quest_id)
     if not quest:
         raise HTTPException(status_code=404, detail="Quest not found")
@@ -171,16 +313,14 @@ async def upload_post(
     if not r2_bucket:
         raise HTTPException(status_code=500, detail="R2 bucket not configured on server")
 
-    raw = await file.read()
-    if not raw:
-        raise HTTPException(status_code=400, detail="Empty file")
+    max_bytes = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File exceeds {max_bytes} bytes")
 
     content_type = file.content_type or "application/octet-stream"
-    lower_ct = content_type.lower()
-    media_type = "video" if lower_ct.startswith("video/") else "image"
 
     # Upload to R2 (S3-compatible)
-    s3 = _get_s3_client()
+    storage = get_storage()
 
     ext = ""
     if file.filename and "." in file.filename:
@@ -188,43 +328,116 @@ async def upload_post(
     key = f"posts/{quest_id}/{uuid.uuid4().hex}{ext}"
 
     try:
-        s3.put_object(
-            Bucket=r2_bucket,
-            Key=key,
-            Body=raw,
-            ContentType=content_type,
-        )
+        storage.upload_fileobj(r2_bucket, key, file.file, content_type, max_bytes)
+    except EmptyUpload:
+        raise HTTPException(status_code=400, detail="Empty file")
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=f"File exceeds {e.max_bytes} bytes")
+    except StorageError:
+        raise  # mapped to a response in main.py
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"R2 upload failed: {e}")
 
-    post = Post(
-        quest_id=quest_id,
-        user_id=user_id,
-        # Store the R2 object key; serve signed URLs to clients.
-        media_url=key,
-        media_type=media_type,
-    )
-    db.add(post)
-    db.commit()
-    db.refresh(post)
+    return _save_post(db, quest, principal, key, _media_type(content_type))
+
 
-    signed_url = _signed_get_url(key)
-    user = db.get(User, user_id)
-    return PostOut(
-        id=post.id,
-        quest_id=post.quest_id,
-        media_url=signed_url,
-        media_type=post.media_type,
-        votes=post.votes,
-        created_at=post.created_at.isoformat() if post.created_at else None,
-        quest_title=quest.title,
-        quest_icon=quest.icon,
-        my_vote=0,
-        poster_username=user.username if user else None,
-        poster_pfp_url=_signed_pfp_url(user.pfp_key) if user else None,
+@router.post("/upload-intent", response_model=UploadIntentOut)
+def create_upload_intent(
+    data: UploadIntentCreate,
+    db: Session = Depends(get_db),
+    user_id: str = Depends(get_current_user_id),
+):
+    """
+    Step 1 of the direct upload flow: return a presigned PUT URL so the browser can
+    upload straight to R2 instead of through this server. The R2 bucket needs a CORS
+    rule allowing PUT from the app origin for this flow.
+
+    Env vars (in addition to the upload_post ones):
+    - R2_UPLOAD_URL_EXPIRES_SECONDS (optional, default 900)
+    """
+    quest = db.get(Quest, data.quest_id)
+    if not quest:
+        raise HTTPException(status_code=404, detail="Quest not found")
+
+    r2_bucket = os.getenv("R2_BUCKET")
+    if not r2_bucket:
+        raise HTTPException(status_code=500, detail="R2 bucket not configured on server")
+
+    content_type = data.content_type.lower()
+    if not content_type.startswith(("image/", "video/")):
+        raise HTTPException(status_code=400, detail="Media must be an image or video")
+
+    max_bytes = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+    if data.size <= 0:
+        raise HTTPException(status_code=400, detail="Empty file")
+    if data.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File exceeds {max_bytes} bytes")
+
+    ext = ""
+    if data.filename and "." in data.filename:
+        ext = "." + data.filename.split(".")[-1].lower()
+    # The user id in the key ties the upload to this user (checked at finalize).
+    key = f"posts/{data.quest_id}/{user_id}/{uuid.uuid4().hex}{ext}"
+
+    expires = int(os.getenv("R2_UPLOAD_URL_EXPIRES_SECONDS", "900"))
+    storage = get_storage()
+    try:
+        upload_url = storage.presign_put(r2_bucket, key, content_type, data.size, expires)
+    except StorageError:
+        raise  # mapped to a response in main.py
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Failed to sign upload URL: {e}")
+
+    return UploadIntentOut(
+        key=key,
+        upload_url=upload_url,
+        headers={"Content-Type": content_type},
+        expires_in=expires,
     )
 
 
+@router.post("/upload-finalize", response_model=PostOut)
+def finalize_upload(
+    data: UploadFinalize,
+    db: Session = Depends(get_db),
+    principal: Principal = Depends(get_current_principal),
+):
+    """
+    Step 2 of the direct upload flow: check that the object from /upload-intent
+    exists in R2 and create the post for it.
+    """
+    quest = db.get(Quest, data.quest_id)
+    if not quest:
+        raise HTTPException(status_code=404, detail="Quest not found")
+
+    r2_bucket = os.getenv("R2_BUCKET")
+    if not r2_bucket:
+        raise HTTPException(status_code=500, detail="R2 bucket not configured on server")
+
+    # Only keys handed out by /upload-intent to this user for this quest can be
+    # finalized, once.
+    if not data.key.startswith(f"posts/{data.quest_id}/{principal.user_id}/") or ".." in data.key:
+        raise HTTPException(status_code=400, detail="Invalid upload key")
+    if db.query(Post.id).filter(Post.media_url == data.key).first():
+        raise HTTPException(status_code=409, detail="Upload already finalized")
+
+    storage = get_storage()
+    try:
+        head = storage.head_object(r2_bucket, data.key)
+    except StorageError:
+        raise  # mapped to a response in main.py
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"R2 lookup failed: {e}")
+    if head is None:
+        raise HTTPException(status_code=404, detail="Uploaded file not found")
+
+    max_bytes = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+    if head["size"] > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File exceeds {max_bytes} bytes")
+
+    return _save_post(db, quest, principal, data.key, _media_type(head["content_type"]))
+
+
 @router.post("/{post_id}/vote", response_model=PostOut)
 def vote_post(
     post_id: str,
@@ -235,86 +448,86 @@ def vote_post(
     """
     Upvote/downvote a post.
     """
-    post = db.get(Post, post_id)
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-
     # Persist per-user vote state so it survives refresh/logout.
-    existing = (
-        db.query(PostVote)
-        .filter(PostVote.post_id == post_id, PostVote.user_id == user_id)
-        .first()
-    )
-    prev_value = int(existing.value) if existing else 0
-    next_value = prev_value + int(delta)
-
-    if next_value not in (-1, 0, 1):
+    try:
+        result = cast_vote(db, "post", post_id, user_id, delta)
+    except InvalidVoteTransition:
+        db.rollback()
         raise HTTPException(status_code=400, detail="Invalid vote transition")
-
-    if next_value == 0:
-        if existing:
-            db.delete(existing)
-    else:
-        if existing:
-            existing.value = next_value
-            db.add(existing)
-        else:
-            db.add(PostVote(post_id=post_id, user_id=user_id, value=next_value))
-
-    post.votes += delta
+    if result is None:
+        raise HTTPException(status_code=404, detail="Post not found")
     db.commit()
-    db.refresh(post)
+    bump_later("posts")
 
-    quest = db.get(Quest, post.quest_id)
-    signed_url = _signed_get_url(post.media_url)
-    user = db.get(User, post.user_id) if post.user_id else None
-    return PostOut(
-        id=post.id,
-        quest_id=post.quest_id,
-        media_url=signed_url,
-        media_type=post.media_type,
-        votes=post.votes,
-        created_at=post.created_at.isoformat() if post.created_at else None,
-        quest_title=quest.title if quest else None,
-        quest_icon=quest.icon if quest else None,
-        my_vote=next_value,
-        poster_username=user.username if user else None,
-        poster_pfp_url=_signed_pfp_url(user.pfp_key) if user else None,
-    )
+    post, my_vote = result
+    event_broker.publish([post.user_id], "post_vote", {"post_id": post.id, "votes": post.votes}, exclude=user_id)
+    # Quest and poster for the response in one statement.
+    quest, user = db.execute(
+        select(Quest, User)
+        .outerjoin(User, User.id == post.user_id)
+        .where(Quest.id == post.quest_id)
+    ).one()
+    return _post_out(post, quest, user, my_vote)
 
 
 @router.get("/{post_id}/comments", response_model=list[CommentOut])
 def list_comments(
     post_id: str,
+    request: Request,
+    response: Response,
+    limit: int | None = Query(None, ge=1, le=100, description="Page size (omit for every comment)"),
+    cursor: str | None = Query(None, description="X-Next-Cursor from the previous page"),
     db: Session = Depends(get_db),
     user_id: str = Depends(get_current_user_id),  # noqa: ARG001 - ensure auth
 ):
+    """
+    Comments on a post, oldest first. Supports If-None-Match.
+
+    With `limit`, returns one page keyset-paginated on (created_at, id); the
+    cursor for the next page is in the X-Next-Cursor header (absent on the
+    last page).
+    """
+    unchanged = not_modified(
+        db, request, response, ("comments", "users"), post_id, limit, cursor, signed_url_epoch(),
+    )
+    if unchanged is not None:
+        return unchanged
+
     post = db.get(Post, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    comments = (
-        db.query(PostComment)
-        .filter(PostComment.post_id == post_id)
-        .order_by(PostComment.created_at.asc())
-        .all()
-    )
+    query = db.query(PostComment).filter(PostComment.post_id == post_id)
+    if cursor:
+        created_at, comment_id = _decode_time_cursor(cursor)
+        query = query.filter(
+            (PostComment.created_at > created_at)
+            | ((PostComment.created_at == created_at) & (PostComment.id > comment_id))
+        )
+    query = query.order_by(PostComment.created_at.asc(), PostComment.id.asc())
+    comments = query.limit(limit).all() if limit else query.all()
+    if limit and len(comments) == limit:
+        last = comments[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at.isoformat(), last.id)
+
+    user_map = load_by_ids(db, User, [c.user_id for c in comments])
 
-    results: list[CommentOut] = []
+    # Keys in CommentOut field order (see list_response).
+    results: list[dict] = []
     for c in comments:
-        user = db.get(User, c.user_id)
+        user = user_map.get(c.user_id)
         results.append(
-            CommentOut(
-                id=c.id,
-                post_id=c.post_id,
-                user_id=c.user_id,
-                username=user.username if user else None,
-                pfp_url=_signed_pfp_url(user.pfp_key) if user else None,
-                content=c.content,
-                created_at=c.created_at.isoformat() if c.created_at else None,
-            )
+            {
+                "id": c.id,
+                "post_id": c.post_id,
+                "user_id": c.user_id,
+                "username": user.username if user else None,
+                "pfp_url": _signed_pfp_url(user.pfp_key, user.pfp_variants) if user else None,
+                "content": c.content,
+                "created_at": c.created_at.isoformat() if c.created_at else None,
+            }
         )
-    return results
+    return list_response(results, response)
 
 
 @router.post("/{post_id}/comments", response_model=CommentOut)
@@ -322,7 +535,7 @@ def create_comment(
     post_id: str,
     data: CommentCreate,
     db: Session = Depends(get_db),
-    user_id: str = Depends(get_current_user_id),
+    principal: Principal = Depends(get_current_principal),
 ):
     post = db.get(Post, post_id)
     if not post:
@@ -333,23 +546,32 @@ def create_comment(
 
     comment = PostComment(
         post_id=post_id,
-        user_id=user_id,
+        user_id=principal.user_id,
         content=data.content.strip(),
     )
     db.add(comment)
+    db.execute(
+        update(Post)
+        .where(Post.id == post_id)
+        .values(comment_count=Post.comment_count + 1)
+        .execution_options(synchronize_session=False)
+    )
     db.commit()
+    bump("posts", "comments")
     db.refresh(comment)
 
-    user = db.get(User, user_id)
-    return CommentOut(
+    user = principal.user(db)
+    out = CommentOut(
         id=comment.id,
         post_id=comment.post_id,
         user_id=comment.user_id,
         username=user.username if user else None,
-        pfp_url=_signed_pfp_url(user.pfp_key) if user else None,
+        pfp_url=_signed_pfp_url(user.pfp_key, user.pfp_variants) if user else None,
         content=comment.content,
         created_at=comment.created_at.isoformat() if comment.created_at else None,
     )
+    event_broker.publish([post.user_id], "comment", out.model_dump(), exclude=principal.user_id)
+    return out
 
 
 @router.delete("/{post_id}")
@@ -367,10 +589,12 @@ def delete_post(
     if post.user_id != user_id:
         raise HTTPException(status_code=403, detail="Not allowed to delete this post")
 
-    # Delete comments first to satisfy FK constraints.
+    # Delete comments and timeline entries first to satisfy FK constraints.
     db.query(PostComment).filter(PostComment.post_id == post_id).delete()
+    remove_post(db, post_id)
     db.delete(post)
     db.commit()
+    bump("posts", "comments")
 
     return {"ok": True}
 
@@ -393,6 +617,30 @@ def backfill_posts_to_cin(
         p.user_id = user.id
         updated += 1
     db.commit()
+    bump("posts")
 
     return {"updated": updated}
 
+
+@router.post("/backfill_comment_counts")
+def backfill_comment_counts(
+    db: Session = Depends(get_db),
+):
+    """
+    One-off helper to recompute posts.comment_count from the post_comments
+    table. Run this once after upgrading.
+    """
+    comments = (
+        select(func.count(PostComment.id))
+        .where(PostComment.post_id == Post.id)
+        .scalar_subquery()
+    )
+    result = db.execute(
+        update(Post)
+        .values(comment_count=comments)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    bump("posts")
+
+    return {"updated": result.rowcount}
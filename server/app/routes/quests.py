@@ -1,13 +1,23 @@
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
 
 from ..database import SessionLocal
+from ..events import event_broker
+from ..fastjson import dumps, encoded_response, list_response
+from ..leaderboards import PERIOD_DAYS, quest_leaderboard
+from ..loaders import load_by_ids
 from ..models import CompletedQuest, Quest, ReceivedQuest
 from ..schemas import QuestCreate, QuestOut
 from ..models import Quest, ReceivedQuest, CompletedQuest, QuestVote, User
 from ..schemas import QuestCreate, QuestOutWithVote
+from ..pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from ..response_cache import quest_list_cache
 from ..security import get_current_user_id
+from ..singleflight import quests_flight
+from ..versions import bump, bump_later, not_modified
+from ..votes import InvalidVoteTransition, cast_vote
 
 router = APIRouter(prefix="/quests")
 
@@ -21,72 +31,138 @@ def get_db():
 
 @router.get("/", response_model=list[QuestOut])
 def get_quests(
+    request: Request,
+    response: Response,
     period: str = Query("all", description="Filter by time period: 'all', 'month', 'week'"),
+    limit: int | None = Query(None, ge=1, le=500, description="Page size (omit for every quest)"),
+    offset: int = Query(0, ge=0),
+    include_difficulty: bool = Query(False, description="Fill in completion_rate for each quest"),
     db: Session = Depends(get_db),
 ):
     """
     Get quests ordered by votes, optionally filtered by time period.
+    Served from the in-memory leaderboard, so no per-request sort of the quests table.
+    Supports If-None-Match (304 while no quest has changed). Without
+    include_difficulty the encoded body is also shared through quest_list_cache.
     """
-    now = datetime.utcnow()
-    query = db.query(Quest)
+    quest_leaderboard.refresh_if_stale(db)
+    unchanged = not_modified(
+        db, request, response, ("quests",),
+        quest_leaderboard.generation, period, limit, offset, include_difficulty,
+        private=False,
+    )
+    if unchanged is not None:
+        return unchanged
+
+    if not include_difficulty:
+        # Keyed by the leaderboard generation too, so a rebuild (e.g. after
+        # another worker's writes) never serves a body built before it.
+        body = quest_list_cache.get(quest_leaderboard.generation, period, limit, offset)
+        if body is None:
+            # Concurrent misses (e.g. right after an invalidation) encode the page once.
+            body = quests_flight.do(
+                ("encoded", period, limit, offset),
+                lambda: _encode_quest_page(db, period, limit, offset),
+            )
+        return encoded_response(body, response)
 
-    if period == "week":
-        week_ago = now - timedelta(days=7)
-        query = query.filter(Quest.created_at >= week_ago)
-    elif period == "month":
-        month_ago = now - timedelta(days=30)
-        query = query.filter(Quest.created_at >= month_ago)
-    # period == "all" or anything else: no date filter
+    def compute() -> list[dict]:
+        top = quest_leaderboard.top(db, period, limit, offset)
+        return _quest_rows(top, _completion_rates(db, [q["id"] for q in top]))
 
-    quests = query.order_by(Quest.votes.desc()).all()
+    return list_response(quests_flight.do(("difficulty", period, limit, offset), compute), response)
 
-    results = []
-    for q in quests:
-        results.append(
-            QuestOut(
-                id=q.id,
-                title=q.title,
-                icon=q.icon,
-                votes=q.votes,
-                created_at=q.created_at.isoformat() if q.created_at else None,
-            )
-        )
-    return results
 
-@router.post("/", response_model=QuestOut)
+def _encode_quest_page(db: Session, period: str, limit: int | None, offset: int) -> bytes:
+    generation = quest_leaderboard.generation
+    body = dumps(_quest_rows(quest_leaderboard.top(db, period, limit, offset), {}))
+    quest_list_cache.set(body, generation, period, limit, offset)
+    return body
+
+
+def _quest_rows(top: list[dict], rates: dict[str, float]) -> list[dict]:
+    # Keys in QuestOut field order (see list_response).
+    return [
+        {
+            "id": q["id"],
+            "title": q["title"],
+            "icon": q["icon"],
+            "votes": q["votes"],
+            "created_at": q["created_at"].isoformat() if q["created_at"] else None,
+            "completion_rate": rates.get(q["id"]),
+        }
+        for q in top
+    ]
+
 @router.get("/with_votes", response_model=list[QuestOutWithVote])
 def get_quests_with_votes(
+    response: Response,
+    period: str = Query("all", description="Filter by time period: 'all', 'month', 'week'"),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str | None = Query(None, description="X-Next-Cursor from the previous page"),
+    include_difficulty: bool = Query(False, description="Fill in completion_rate for each quest"),
     db: Session = Depends(get_db),
     user_id: str = Depends(get_current_user_id),
 ):
-    quests = db.query(Quest).order_by(Quest.votes.desc()).all()
-    quest_ids = [q.id for q in quests]
-    vote_map: dict[str, int] = {}
-    if quest_ids:
-        votes = (
-            db.query(QuestVote)
-            .filter(QuestVote.user_id == user_id, QuestVote.quest_id.in_(quest_ids))
-            .all()
+    """
+    Quests ordered by votes with the current user's vote, one page at a time.
+    my_vote comes from a LEFT JOIN on this user's quest_votes row, so the query
+    only touches the quests on the page. NULL votes count as 0, in the order
+    and in the cursor alike, so those quests are not skipped.
+    """
+    votes_col = func.coalesce(Quest.votes, 0)
+    query = (
+        db.query(Quest, QuestVote.value)
+        .outerjoin(
+            QuestVote,
+            (QuestVote.quest_id == Quest.id) & (QuestVote.user_id == user_id),
         )
-        vote_map = {v.quest_id: int(v.value) for v in votes}
+    )
 
-    return [
-        QuestOutWithVote(
-            id=q.id,
-            title=q.title,
-            icon=q.icon,
-            votes=q.votes,
-            my_vote=vote_map.get(q.id, 0),
+    days = PERIOD_DAYS.get(period)
+    if days is not None:
+        query = query.filter(Quest.created_at >= datetime.utcnow() - timedelta(days=days))
+
+    if cursor:
+        votes, quest_id = decode_cursor(cursor, 2)
+        try:
+            votes = int(votes)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(
+            (votes_col < votes) | ((votes_col == votes) & (Quest.id < quest_id))
         )
-        for q in quests
-    ]
+
+    rows = query.order_by(votes_col.desc(), Quest.id.desc()).limit(limit).all()
+    if len(rows) == limit:
+        last = rows[-1][0]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.votes or 0, last.id)
+
+    # Keys in QuestOutWithVote field order (see list_response).
+    return list_response([
+        {
+            "id": q.id,
+            "title": q.title,
+            "icon": q.icon,
+            "votes": q.votes or 0,
+            "created_at": q.created_at.isoformat() if q.created_at else None,
+            "completion_rate": (
+                _completion_rate(q.received_count, q.completed_count) if include_difficulty else None
+            ),
+            "my_vote": int(my_vote or 0),
+        }
+        for q, my_vote in rows
+    ], response)
 
 @router.post("/")
 def create_quest(data: QuestCreate, db: Session = Depends(get_db)):
     quest = Quest(title=data.title, icon=data.icon)
     db.add(quest)
     db.commit()
+    bump("quests")
     db.refresh(quest)
+    quest_leaderboard.add(quest)
+    quest_list_cache.invalidate()
     return QuestOut(
         id=quest.id,
         title=quest.title,
@@ -96,56 +172,33 @@ def create_quest(data: QuestCreate, db: Session = Depends(get_db)):
     )
 
 @router.post("/{quest_id}/vote", response_model=QuestOut)
-def vote(quest_id: str, delta: int, db: Session = Depends(get_db)):
-    quest = db.query(Quest).get(quest_id)
-    if not quest:
-        raise HTTPException(status_code=404, detail="Quest not found")
-    quest.votes += delta
-    db.commit()
-    db.refresh(quest)
-    return QuestOut(
-        id=quest.id,
-        title=quest.title,
-        icon=quest.icon,
-        votes=quest.votes,
-        created_at=quest.created_at.isoformat() if quest.created_at else None,
-    )
-@router.post("/{quest_id}/vote")
 def vote(
     quest_id: str,
     delta: int,
     db: Session = Depends(get_db),
     user_id: str = Depends(get_current_user_id),
 ):
-    quest = db.get(Quest, quest_id)
-    if not quest:
+    try:
+        result = cast_vote(db, "quest", quest_id, user_id, delta)
+    except InvalidVoteTransition:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Invalid vote transition")
+    if result is None:
         raise HTTPException(status_code=404, detail="Quest not found")
+    db.commit()
+    bump_later("quests")
 
-    existing = (
-        db.query(QuestVote)
-        .filter(QuestVote.quest_id == quest_id, QuestVote.user_id == user_id)
-        .first()
+    quest, _ = result
+    quest_leaderboard.update(quest.id, quest.votes)
+    quest_list_cache.invalidate()
+    event_broker.publish([quest.creator_id], "quest_vote", {"quest_id": quest.id, "votes": quest.votes}, exclude=user_id)
+    return QuestOut(
+        id=quest.id,
+        title=quest.title,
+        icon=quest.icon,
+        votes=quest.votes,
+        created_at=quest.created_at.isoformat() if quest.created_at else None,
     )
-    prev_value = int(existing.value) if existing else 0
-    next_value = prev_value + int(delta)
-
-    if next_value not in (-1, 0, 1):
-        raise HTTPException(status_code=400, detail="Invalid vote transition")
-
-    if next_value == 0:
-        if existing:
-            db.delete(existing)
-    else:
-        if existing:
-            existing.value = next_value
-            db.add(existing)
-        else:
-            db.add(QuestVote(quest_id=quest_id, user_id=user_id, value=next_value))
-
-    quest.votes += delta
-    db.commit()
-    db.refresh(quest)
-    return quest
 
 @router.post("/{quest_id}/complete")
 def complete_quest(
@@ -187,7 +240,11 @@ def complete_quest(
     )
 
     db.add(completed)
+    db.query(Quest).filter(Quest.id == quest_id).update(
+        {Quest.completed_count: Quest.completed_count + 1}, synchronize_session=False
+    )
     db.commit()
+    bump_later("quests")
 
     quest = db.get(Quest, quest_id)
 
@@ -222,14 +279,17 @@ def get_received_quests(
         .all()
     )
 
+    quest_map = load_by_ids(db, Quest, [rq.quest_id for rq in rqs])
+
     quests = []
     for rq in rqs:
-        q = db.query(Quest).get(rq.quest_id)
-        quests.append({
-            "id": q.id,
-            "title": q.title,
-            "icon": q.icon,
-        })
+        q = quest_map.get(rq.quest_id)
+        if q:
+            quests.append({
+                "id": q.id,
+                "title": q.title,
+                "icon": q.icon,
+            })
 
     return quests
 
@@ -270,9 +330,10 @@ def get_completed_quests(
     Return all quests that the current user has completed, including their icons and titles.
     """
     cqs = db.query(CompletedQuest).filter(CompletedQuest.user_id == user_id).all()
+    quest_map = load_by_ids(db, Quest, [cq.quest_id for cq in cqs])
     results = []
     for cq in cqs:
-        q = db.get(Quest, cq.quest_id)
+        q = quest_map.get(cq.quest_id)
         if q:
             results.append(
                 {
@@ -298,9 +359,10 @@ def get_completed_quests_for_user(
     request badges for any user id they are allowed to see.
     """
     cqs = db.query(CompletedQuest).filter(CompletedQuest.user_id == user_id).all()
+    quest_map = load_by_ids(db, Quest, [cq.quest_id for cq in cqs])
     results = []
     for cq in cqs:
-        q = db.get(Quest, cq.quest_id)
+        q = quest_map.get(cq.quest_id)
         if q:
             results.append(
                 {
@@ -328,10 +390,75 @@ def backfill_quest_created_at(
         q.created_at = two_hours_ago
         updated += 1
     db.commit()
+    bump("quests")
+    quest_leaderboard.rebuild(db)
+    quest_list_cache.invalidate()
 
     return {"updated": updated}
 
 
+def _completion_rate(received_count: int, completed_count: int) -> float:
+    """
+    Completion percentage (0-100) used as the quest difficulty.
+    """
+    if not received_count:
+        return 100.0  # If no one received it, treat as 100% (easiest)
+    return (completed_count / received_count) * 100.0
+
+
+def _completion_rates(db: Session, quest_ids: list[str]) -> dict[str, float]:
+    rows = (
+        db.query(Quest.id, Quest.received_count, Quest.completed_count)
+        .filter(Quest.id.in_(set(quest_ids)))
+        .all()
+        if quest_ids
+        else []
+    )
+    return {r.id: _completion_rate(r.received_count, r.completed_count) for r in rows}
+
+
+@router.get("/difficulty")
+def get_quest_difficulties(
+    ids: list[str] = Query(..., max_length=200, description="Quest ids (repeat the parameter)"),
+    db: Session = Depends(get_db),
+):
+    """
+    Batch version of /{quest_id}/difficulty: {quest_id: {"completion_rate": ...}}
+    for every requested id, in one query.
+    """
+    rates = _completion_rates(db, ids)
+    return {quest_id: {"completion_rate": rates.get(quest_id, 100.0)} for quest_id in ids}
+
+
+@router.post("/backfill_completion_counts")
+def backfill_completion_counts(
+    db: Session = Depends(get_db),
+):
+    """
+    One-off helper to recompute quests.received_count / completed_count from the
+    received_quests / completed_quests tables. Run this once after upgrading.
+    """
+    received = (
+        select(func.count(ReceivedQuest.id))
+        .where(ReceivedQuest.quest_id == Quest.id)
+        .scalar_subquery()
+    )
+    completed = (
+        select(func.count(CompletedQuest.id))
+        .where(CompletedQuest.quest_id == Quest.id)
+        .scalar_subquery()
+    )
+    result = db.execute(
+        update(Quest)
+        .values(received_count=received, completed_count=completed)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    bump("quests")
+
+    return {"updated": result.rowcount}
+
+
 @router.get("/{quest_id}/difficulty")
 def get_quest_difficulty(
     quest_id: str,
@@ -341,15 +468,7 @@ def get_quest_difficulty(
     Calculate quest difficulty based on completion rate.
     Returns completion percentage (0-100).
     """
-    received_count = db.query(ReceivedQuest).filter(ReceivedQuest.quest_id == quest_id).count()
-    completed_count = db.query(CompletedQuest).filter(CompletedQuest.quest_id == quest_id).count()
-    
-    if received_count == 0:
-        completion_rate = 100.0  # If no one received it, treat as 100% (easiest)
-    else:
-        completion_rate = (completed_count / received_count) * 100.0
-    
-    return {"completion_rate": completion_rate}
+    return {"completion_rate": _completion_rates(db, [quest_id]).get(quest_id, 100.0)}
 
 
 @router.get("/completed/by-username/{username}")
@@ -366,9 +485,10 @@ def get_completed_quests_by_username(
         raise HTTPException(status_code=404, detail="User not found")
 
     cqs = db.query(CompletedQuest).filter(CompletedQuest.user_id == u.id).all()
+    quest_map = load_by_ids(db, Quest, [cq.quest_id for cq in cqs])
     results = []
     for cq in cqs:
-        q = db.get(Quest, cq.quest_id)
+        q = quest_map.get(cq.quest_id)
         if q:
             results.append(
                 {
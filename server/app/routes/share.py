@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 from ..database import SessionLocal
-from ..models import ReceivedQuest
-from ..schemas import ShareQuest
+from ..events import event_broker
+from ..models import Quest, ReceivedQuest, friendships
+from ..schemas import ShareQuest, ShareQuestBulk
 from ..security import get_current_user_id
+from ..versions import bump_later
 
 
 router = APIRouter(prefix="/share")
@@ -29,7 +32,62 @@ def share_quest(
         user_id=data.to_user_id,
     )
     db.add(rq)
+    db.query(Quest).filter(Quest.id == data.quest_id).update(
+        {Quest.received_count: Quest.received_count + 1}, synchronize_session=False
+    )
     db.commit()
+    bump_later("quests")
 
+    event_broker.publish([data.to_user_id], "quest_shared", {"quest_id": data.quest_id, "from_user_id": user_id})
     return {"ok": True}
 
+
+@router.post("/bulk")
+def share_quest_bulk(
+    data: ShareQuestBulk,
+    user_id: str = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+):
+    """
+    Share one quest with many friends in a single transaction.
+
+    Recipients who are not friends of the current user, or who already hold the
+    quest in "received", are skipped and reported back. Everyone else gets a
+    ReceivedQuest from one multi-row INSERT.
+    """
+    if db.get(Quest, data.quest_id) is None:
+        raise HTTPException(status_code=404, detail="Quest not found")
+
+    recipients = list(dict.fromkeys(data.to_user_ids))
+    friend_ids = {
+        r.friend_id
+        for r in db.query(friendships.c.friend_id)
+        .filter(friendships.c.user_id == user_id, friendships.c.friend_id.in_(recipients))
+    }
+    holders = {
+        r.user_id
+        for r in db.query(ReceivedQuest.user_id).filter(
+            ReceivedQuest.quest_id == data.quest_id,
+            ReceivedQuest.user_id.in_(recipients),
+            ReceivedQuest.status == "received",
+        )
+    }
+
+    shared = [r for r in recipients if r in friend_ids and r not in holders]
+    if shared:
+        db.execute(
+            insert(ReceivedQuest),
+            [{"quest_id": data.quest_id, "user_id": r} for r in shared],
+        )
+        db.query(Quest).filter(Quest.id == data.quest_id).update(
+            {Quest.received_count: Quest.received_count + len(shared)}, synchronize_session=False
+        )
+        db.commit()
+        bump_later("quests")
+
+    event_broker.publish(shared, "quest_shared", {"quest_id": data.quest_id, "from_user_id": user_id})
+    return {
+        "shared": shared,
+        "skipped_not_friends": [r for r in recipients if r not in friend_ids],
+        "skipped_already_received": [r for r in recipients if r in friend_ids and r in holders],
+    }
@@ -1,13 +1,17 @@
 import os
 import uuid
 
-import boto3
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
 
 from ..database import SessionLocal
+from ..derivatives import PFP_DISPLAY_WIDTH, pick_variant, schedule_pfp_derivatives
+from ..executors import run_blocking, upload_executor
 from ..models import User
-from ..security import get_current_user_id
+from ..security import Principal, get_current_principal, get_current_user_id
+from ..storage import EmptyUpload, StorageError, UploadTooLarge, get_storage
+from ..url_cache import signed_url_cache
+from ..versions import bump
 
 
 router = APIRouter(prefix="/users")
@@ -21,54 +25,44 @@ def get_db():
         db.close()
 
 
-def _get_s3_client():
-    r2_account_id = os.getenv("R2_ACCOUNT_ID")
-    r2_access_key_id = os.getenv("R2_ACCESS_KEY_ID")
-    r2_secret_access_key = os.getenv("R2_SECRET_ACCESS_KEY")
-    if not (r2_account_id and r2_access_key_id and r2_secret_access_key):
-        raise HTTPException(status_code=500, detail="R2 credentials not configured on server")
-
-    endpoint_url = f"https://{r2_account_id}.r2.cloudflarestorage.com"
-    return boto3.client(
-        "s3",
-        endpoint_url=endpoint_url,
-        aws_access_key_id=r2_access_key_id,
-        aws_secret_access_key=r2_secret_access_key,
-        region_name="auto",
-    )
-
-
-def _signed_pfp_url(key: str | None) -> str | None:
+def _signed_pfp_url(key: str | None, variants: dict | None = None) -> str | None:
+    """
+    Signed URL for a profile picture, using the smallest resized variant that is
+    at least PFP_DISPLAY_WIDTH wide once one exists.
+    """
     if not key:
         return None
+    key = pick_variant(key, variants, PFP_DISPLAY_WIDTH)
     r2_bucket = os.getenv("R2_PFP_BUCKET")
     if not r2_bucket:
         raise HTTPException(status_code=500, detail="R2_PFP_BUCKET not configured on server")
 
     expires = int(os.getenv("R2_PFP_SIGNED_URL_EXPIRES_SECONDS", "3600"))
-    s3 = _get_s3_client()
-    try:
-        return s3.generate_presigned_url(
-            ClientMethod="get_object",
-            Params={"Bucket": r2_bucket, "Key": key},
-            ExpiresIn=expires,
-        )
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Failed to sign pfp URL: {e}")
+
+    def sign() -> str:
+        storage = get_storage()
+        try:
+            return storage.presign_get(r2_bucket, key, expires)
+        except StorageError:
+            raise  # mapped to a response in main.py
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Failed to sign pfp URL: {e}")
+
+    return signed_url_cache.get_or_sign(r2_bucket, key, expires, sign)
 
 
 @router.get("/me")
 def get_me(
     db: Session = Depends(get_db),
-    user_id: str = Depends(get_current_user_id),
+    principal: Principal = Depends(get_current_principal),
 ):
-    user = db.get(User, user_id)
+    user = principal.user(db)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return {
         "id": user.id,
         "username": user.username,
-        "pfp_url": _signed_pfp_url(user.pfp_key),
+        "pfp_url": _signed_pfp_url(user.pfp_key, user.pfp_variants),
     }
 
 
@@ -76,9 +70,15 @@ def get_me(
 async def upload_pfp(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    user_id: str = Depends(get_current_user_id),
+    principal: Principal = Depends(get_current_principal),
 ):
-    user = db.get(User, user_id)
+    # Storage, DB and signing calls all block, so they run on the upload executor.
+    return await run_blocking(upload_executor, _upload_pfp, file, db, principal)
+
+
+def _upload_pfp(file: UploadFile, db: Session, principal: Principal) -> dict:
+    user_id = principal.user_id
+    user = principal.user(db)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -90,11 +90,11 @@ async def upload_pfp(
     if not content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Profile picture must be an image")
 
-    raw = await file.read()
-    if not raw:
-        raise HTTPException(status_code=400, detail="Empty file")
+    max_bytes = int(os.getenv("MAX_PFP_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File exceeds {max_bytes} bytes")
 
-    s3 = _get_s3_client()
+    storage = get_storage()
 
     ext = ""
     if file.filename and "." in file.filename:
@@ -102,17 +102,22 @@ async def upload_pfp(
     key = f"pfp/{user_id}/{uuid.uuid4().hex}{ext}"
 
     try:
-        s3.put_object(
-            Bucket=r2_bucket,
-            Key=key,
-            Body=raw,
-            ContentType=content_type,
-        )
+        storage.upload_fileobj(r2_bucket, key, file.file, content_type, max_bytes)
+    except EmptyUpload:
+        raise HTTPException(status_code=400, detail="Empty file")
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=f"File exceeds {e.max_bytes} bytes")
+    except StorageError:
+        raise  # mapped to a response in main.py
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"R2 pfp upload failed: {e}")
 
     user.pfp_key = key
+    user.pfp_variants = None
     db.commit()
+    bump("users")
+
+    schedule_pfp_derivatives(user_id, r2_bucket, key)
 
     url = _signed_pfp_url(key)
     return {"pfp_url": url}
@@ -134,6 +139,6 @@ def get_user_by_username(
     return {
         "id": user.id,
         "username": user.username,
-        "pfp_url": _signed_pfp_url(user.pfp_key),
+        "pfp_url": _signed_pfp_url(user.pfp_key, user.pfp_variants),
     }
 
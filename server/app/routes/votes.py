@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..events import event_broker
+from ..leaderboards import quest_leaderboard
+from ..response_cache import quest_list_cache
+from ..schemas import VoteBatch, VoteResult
+from ..security import get_current_user_id
+from ..versions import bump_later
+from ..votes import InvalidVoteTransition, cast_vote
+
+
+router = APIRouter(prefix="/votes")
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@router.post("/batch", response_model=list[VoteResult])
+def vote_batch(
+    data: VoteBatch,
+    db: Session = Depends(get_db),
+    user_id: str = Depends(get_current_user_id),
+):
+    """
+    Apply a list of quest/post votes (same `delta` semantics as the single vote
+    routes, applied in order) in one transaction, e.g. to flush votes a client
+    queued while offline. Either every vote is applied or none is.
+    """
+    results: list[VoteResult] = []
+    owners: list[str | None] = []
+    for i, v in enumerate(data.votes):
+        try:
+            result = cast_vote(db, v.kind, v.id, user_id, v.delta)
+        except InvalidVoteTransition:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=f"Invalid vote transition at index {i}")
+        if result is None:
+            db.rollback()
+            raise HTTPException(status_code=404, detail=f"{v.kind.capitalize()} not found at index {i}")
+        item, my_vote = result
+        results.append(VoteResult(kind=v.kind, id=v.id, votes=item.votes, my_vote=my_vote))
+        owners.append(item.creator_id if v.kind == "quest" else item.user_id)
+    db.commit()
+    bump_later(*{"quests" if r.kind == "quest" else "posts" for r in results})
+
+    for r in results:
+        if r.kind == "quest":
+            quest_leaderboard.update(r.id, r.votes)
+    if any(r.kind == "quest" for r in results):
+        quest_list_cache.invalidate()
+    for r, owner in zip(results, owners):
+        event_broker.publish([owner], f"{r.kind}_vote", {f"{r.kind}_id": r.id, "votes": r.votes}, exclude=user_id)
+    return results
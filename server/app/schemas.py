@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from typing import Literal
+
+from pydantic import BaseModel, Field
 
 
 class ShareQuest(BaseModel):
@@ -6,6 +8,11 @@ class ShareQuest(BaseModel):
     to_user_id: str
 
 
+class ShareQuestBulk(BaseModel):
+    quest_id: str
+    to_user_ids: list[str] = Field(..., min_length=1, max_length=500)
+
+
 class UserCreate(BaseModel):
     username: str
     password: str
@@ -26,6 +33,8 @@ class QuestOut(BaseModel):
     icon: str
     votes: int
     created_at: str | None = None
+    # Only filled in when the listing is called with include_difficulty=true.
+    completion_rate: float | None = None
 
 
 class QuestOutWithVote(QuestOut):
@@ -38,12 +47,34 @@ class PostCreate(BaseModel):
     media_type: str  # "image" | "video"
 
 
+class UploadIntentCreate(BaseModel):
+    quest_id: str
+    content_type: str
+    size: int
+    filename: str | None = None
+
+
+class UploadIntentOut(BaseModel):
+    key: str
+    upload_url: str
+    method: str = "PUT"
+    # Headers the client must send with the upload (they are part of the signature).
+    headers: dict[str, str]
+    expires_in: int
+
+
+class UploadFinalize(BaseModel):
+    quest_id: str
+    key: str
+
+
 class PostOut(BaseModel):
     id: str
     quest_id: str
     media_url: str
     media_type: str
     votes: int
+    comment_count: int = 0
     created_at: str | None = None
     quest_title: str | None = None
     quest_icon: str | None = None
@@ -65,3 +96,20 @@ class CommentOut(BaseModel):
   pfp_url: str | None = None
   content: str
   created_at: str | None = None
+
+
+class VoteIn(BaseModel):
+    kind: Literal["quest", "post"]
+    id: str
+    delta: int
+
+
+class VoteBatch(BaseModel):
+    votes: list[VoteIn] = Field(..., min_length=1, max_length=100)
+
+
+class VoteResult(BaseModel):
+    kind: str
+    id: str
+    votes: int
+    my_vote: int
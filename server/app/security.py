@@ -1,25 +1,128 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from jose import jwt
 from passlib.context import CryptContext
 import os
+import threading
+import time
 
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.orm import Session
+
+from .models import User
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+
+class VerifiedTokenCache:
+    """
+    LRU of tokens that already passed JWT verification: token -> (user id, exp).
+    Entries are only used until the token's own `exp`, so caching never extends
+    a token's lifetime.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return entry[0]
+
+    def put(self, token: str, user_id: str, exp: float) -> None:
+        with self._lock:
+            self._entries[token] = (user_id, exp)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+# - TOKEN_CACHE_SIZE (optional, default 10000 tokens)
+token_cache = VerifiedTokenCache(maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")))
+
 
 def get_current_user_id(
     creds: HTTPAuthorizationCredentials = Depends(security),
 ):
+    return user_id_from_token(creds.credentials)
+
+
+def get_stream_user_id(
+    token: str | None = Query(None, description="Stream token from POST /events/token (EventSource cannot send headers)"),
+    creds: HTTPAuthorizationCredentials | None = Depends(optional_security),
+):
+    """
+    Like get_current_user_id, but also accepts a stream token as ?token=... for
+    browser EventSource connections. Only short-lived stream tokens are taken
+    from the URL, where access logs and proxies may record them; login tokens
+    must come in the Authorization header.
+    """
+    if creds is not None:
+        return user_id_from_token(creds.credentials)
+    if token:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except Exception:
+            raise HTTPException(status_code=401)
+        if payload.get("scope") != STREAM_TOKEN_SCOPE:
+            raise HTTPException(status_code=401)
+        return payload["sub"]
+    raise HTTPException(status_code=401)
+
+
+def user_id_from_token(token: str) -> str:
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
     try:
         payload = jwt.decode(
-            creds.credentials,
+            token,
             SECRET_KEY,
             algorithms=[ALGORITHM],
         )
-        return payload["sub"]
+        user_id = payload["sub"]
     except:
         raise HTTPException(status_code=401)
+    if "scope" in payload:
+        # Scoped tokens (e.g. stream tokens) are not login tokens.
+        raise HTTPException(status_code=401)
+    if "exp" in payload:
+        token_cache.put(token, user_id, float(payload["exp"]))
+    return user_id
+
+
+class Principal:
+    """
+    The authenticated caller for one request. The User row is loaded on first
+    use and reused for the rest of the request.
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self._user: User | None = None
+        self._loaded = False
+
+    def user(self, db: Session) -> User | None:
+        if not self._loaded:
+            self._user = db.get(User, self.user_id)
+            self._loaded = True
+        return self._user
+
+
+def get_current_principal(user_id: str = Depends(get_current_user_id)) -> Principal:
+    # FastAPI caches dependencies per request, so every Depends(get_current_principal)
+    # in one request shares this instance.
+    return Principal(user_id)
 
 
 SECRET_KEY = os.getenv("JWT_SECRET")
@@ -39,30 +142,78 @@ def _with_salt(password: str) -> str:
     return f"{PASSWORD_SALT}{password}"
 
 
-def hash_password(password: str) -> str:
-    # New scheme: hash salted password (salt + password)
-    return pwd_context.hash(_with_salt(password))
+# Stored hashes are tagged with the scheme that produced them, so a login only
+# ever needs one bcrypt verification:
+# - "v1:<bcrypt>": bcrypt of the salted password (salt + password)
+# - "<bcrypt>" (untagged): written before tagging existed; either salted or a
+#   legacy hash of the raw password. Upgraded to "v1:" on the next successful login.
+SALTED_HASH_PREFIX = "v1:"
 
 
-def verify_password(password: str, hashed: str) -> bool:
-    # First try verifying with salted password (new scheme)
-    try:
-        if pwd_context.verify(_with_salt(password), hashed):
-            return True
-    except Exception:
-        # If verification fails due to scheme/format issues, fall through to legacy check.
-        pass
+def hash_password(password: str) -> str:
+    # New scheme: hash salted password (salt + password), tagged with its version
+    return SALTED_HASH_PREFIX + pwd_context.hash(_with_salt(password))
 
-    # Fallback: verify legacy hashes that were created without the additional salt.
+
+def _verify(secret: str, hashed: str) -> bool:
     try:
-        return pwd_context.verify(password, hashed)
+        return pwd_context.verify(secret, hashed)
     except Exception:
+        # Malformed / unknown hash format
         return False
 
 
+def verify_and_update(password: str, hashed: str) -> tuple[bool, str | None]:
+    """
+    Check a password against a stored hash.
+
+    Returns (ok, new_hash). new_hash is set when the stored hash should be
+    replaced: untagged hashes are re-hashed into the current "v1:" scheme, as are
+    "v1:" hashes whose bcrypt cost is out of date.
+    """
+    if hashed.startswith(SALTED_HASH_PREFIX):
+        inner = hashed[len(SALTED_HASH_PREFIX):]
+        if not _verify(_with_salt(password), inner):
+            return False, None
+        return True, hash_password(password) if pwd_context.needs_update(inner) else None
+
+    # Untagged: the salted form was tried first before, keep that order. Without a
+    # configured salt both forms are the same string, so only one check is needed.
+    candidates = [_with_salt(password)]
+    if PASSWORD_SALT:
+        candidates.append(password)
+    for candidate in candidates:
+        if _verify(candidate, hashed):
+            return True, hash_password(password)
+    return False, None
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    ok, _ = verify_and_update(password, hashed)
+    return ok
+
+
 def create_token(user_id: str):
     payload = {
         "sub": user_id,
         "exp": datetime.utcnow() + timedelta(days=7)
     }
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+
+
+STREAM_TOKEN_SCOPE = "events"
+# - EVENTS_STREAM_TOKEN_SECONDS (optional, default 60)
+STREAM_TOKEN_SECONDS = int(os.getenv("EVENTS_STREAM_TOKEN_SECONDS", "60"))
+
+
+def create_stream_token(user_id: str) -> str:
+    """
+    Short-lived token that only opens the event stream. It goes in the URL, so
+    it is kept useless for anything else and expires quickly.
+    """
+    payload = {
+        "sub": user_id,
+        "scope": STREAM_TOKEN_SCOPE,
+        "exp": datetime.utcnow() + timedelta(seconds=STREAM_TOKEN_SECONDS),
+    }
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
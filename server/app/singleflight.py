@@ -0,0 +1,69 @@
+import threading
+from typing import Callable, Hashable, TypeVar
+
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical computations within this process.
+
+    The first caller for a key runs `fn`; callers arriving with the same key
+    while it is in flight wait for it and get the same result (or exception)
+    instead of running `fn` again. Nothing is kept once the call finishes, so
+    this only collapses stampedes and never serves stale data.
+
+    The result is shared between requests: it must be plain data that callers
+    do not mutate (no ORM objects tied to the leader's session).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.executed = 0
+        self.coalesced = 0
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+# Expensive read endpoints (keyed by route parameters; per-user parts are applied afterwards).
+quests_flight = SingleFlight("quests")
+posts_flight = SingleFlight("posts")
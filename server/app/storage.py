@@ -0,0 +1,392 @@
+import itertools
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO, Iterator
+from urllib.parse import quote
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+
+logger = logging.getLogger(__name__)
+
+# Streaming uploads are read and sent in chunks of this many bytes. S3/R2 multipart
+# uploads need every part but the last to be at least 5 MiB.
+UPLOAD_CHUNK_SIZE = max(int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024))), 5 * 1024 * 1024)
+
+
+class StorageError(Exception):
+    """
+    Storage failure the routes turn into an HTTP response (see main.py); the
+    backends themselves know nothing about HTTP.
+    """
+
+
+class StorageNotConfigured(StorageError):
+    pass
+
+
+class InvalidObjectKey(StorageError):
+    pass
+
+
+class EmptyUpload(Exception):
+    pass
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+def _read_chunks(fileobj: BinaryIO, max_bytes: int | None) -> Iterator[bytes]:
+    """
+    Yield UPLOAD_CHUNK_SIZE chunks from `fileobj`, raising UploadTooLarge as soon
+    as more than `max_bytes` have been read and EmptyUpload if there is no data.
+    """
+    total = 0
+    while True:
+        chunk = fileobj.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            if total == 0:
+                raise EmptyUpload()
+            return
+        total += len(chunk)
+        if max_bytes is not None and total > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        yield chunk
+
+
+class StorageBackend(ABC):
+    """
+    Minimal object storage interface used by the routers.
+
+    R2Storage talks to Cloudflare R2 through the S3 API; MemoryStorage and
+    FileSystemStorage are local stand-ins for tests and benchmarks. A backend
+    missing any abstract method fails when it is constructed, not on first use.
+    """
+
+    @abstractmethod
+    def put_object(self, bucket: str, key: str, body: bytes, content_type: str) -> None:
+        ...
+
+    def upload_fileobj(
+        self,
+        bucket: str,
+        key: str,
+        fileobj: BinaryIO,
+        content_type: str,
+        max_bytes: int | None = None,
+    ) -> int:
+        """
+        Stream `fileobj` into storage and return the number of bytes written.
+        Nothing is stored if the upload is empty or larger than `max_bytes`.
+        """
+        body = b"".join(_read_chunks(fileobj, max_bytes))
+        self.put_object(bucket, key, body, content_type)
+        return len(body)
+
+    @abstractmethod
+    def presign_get(self, bucket: str, key: str, expires_in: int) -> str:
+        ...
+
+    @abstractmethod
+    def presign_put(
+        self, bucket: str, key: str, content_type: str, content_length: int, expires_in: int
+    ) -> str:
+        """
+        URL the browser can PUT the object to directly. Content-Type and
+        Content-Length are part of the signature, so the client must send exactly those.
+        """
+
+    @abstractmethod
+    def get_object(self, bucket: str, key: str) -> bytes:
+        ...
+
+    @abstractmethod
+    def head_object(self, bucket: str, key: str) -> dict | None:
+        """
+        Return {"size": int, "content_type": str} for an existing object, else None.
+        """
+
+
+class R2Storage(StorageBackend):
+    """
+    Cloudflare R2 (S3-compatible) backend.
+
+    One boto3 client per bucket is built lazily and then shared by every request;
+    boto3 clients are thread-safe once constructed, but construction is not, so
+    it happens under a lock.
+
+    Env vars:
+    - R2_ACCOUNT_ID
+    - R2_ACCESS_KEY_ID
+    - R2_SECRET_ACCESS_KEY
+    - R2_MAX_POOL_CONNECTIONS (optional, default 50)
+    """
+
+    def __init__(self):
+        self.account_id = os.getenv("R2_ACCOUNT_ID")
+        self.access_key_id = os.getenv("R2_ACCESS_KEY_ID")
+        self.secret_access_key = os.getenv("R2_SECRET_ACCESS_KEY")
+        if not (self.account_id and self.access_key_id and self.secret_access_key):
+            raise StorageNotConfigured("R2 credentials not configured on server")
+
+        self.config = Config(
+            signature_version="s3v4",
+            max_pool_connections=int(os.getenv("R2_MAX_POOL_CONNECTIONS", "50")),
+            retries={"max_attempts": 3, "mode": "standard"},
+            tcp_keepalive=True,
+        )
+        self._clients: dict = {}
+        self._lock = threading.Lock()
+
+    def client(self, bucket: str):
+        client = self._clients.get(bucket)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(bucket)
+                if client is None:
+                    client = boto3.session.Session().client(
+                        "s3",
+                        endpoint_url=f"https://{self.account_id}.r2.cloudflarestorage.com",
+                        aws_access_key_id=self.access_key_id,
+                        aws_secret_access_key=self.secret_access_key,
+                        region_name="auto",
+                        config=self.config,
+                    )
+                    self._clients[bucket] = client
+        return client
+
+    def put_object(self, bucket: str, key: str, body: bytes, content_type: str) -> None:
+        self.client(bucket).put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=body,
+            ContentType=content_type,
+        )
+
+    def upload_fileobj(
+        self,
+        bucket: str,
+        key: str,
+        fileobj: BinaryIO,
+        content_type: str,
+        max_bytes: int | None = None,
+    ) -> int:
+        """
+        Files that fit in one chunk go up with a single put_object; anything larger
+        is sent as a multipart upload, one chunk per part, so at most two chunks are
+        held in memory. A failed multipart upload is aborted so no parts linger.
+        """
+        chunks = _read_chunks(fileobj, max_bytes)
+        first = next(chunks)
+        second = next(chunks, None)
+        if second is None:
+            self.put_object(bucket, key, first, content_type)
+            return len(first)
+
+        client = self.client(bucket)
+        upload_id = client.create_multipart_upload(
+            Bucket=bucket,
+            Key=key,
+            ContentType=content_type,
+        )["UploadId"]
+        try:
+            parts = []
+            total = 0
+            for part_number, chunk in enumerate(itertools.chain([first, second], chunks), start=1):
+                resp = client.upload_part(
+                    Bucket=bucket,
+                    Key=key,
+                    PartNumber=part_number,
+                    UploadId=upload_id,
+                    Body=chunk,
+                )
+                parts.append({"ETag": resp["ETag"], "PartNumber": part_number})
+                total += len(chunk)
+                # Drop references so only the chunk being read is kept alive.
+                first = second = None
+            client.complete_multipart_upload(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            # A failed abort must not hide why the upload failed. Its parts stay
+            # in the bucket; the upload id is logged so they can be aborted later.
+            try:
+                client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            except Exception:
+                logger.exception("Failed to abort multipart upload %s for %s/%s", upload_id, bucket, key)
+            raise
+        return total
+
+    def presign_get(self, bucket: str, key: str, expires_in: int) -> str:
+        return self.client(bucket).generate_presigned_url(
+            ClientMethod="get_object",
+            Params={"Bucket": bucket, "Key": key},
+            ExpiresIn=expires_in,
+        )
+
+    def presign_put(
+        self, bucket: str, key: str, content_type: str, content_length: int, expires_in: int
+    ) -> str:
+        return self.client(bucket).generate_presigned_url(
+            ClientMethod="put_object",
+            Params={
+                "Bucket": bucket,
+                "Key": key,
+                "ContentType": content_type,
+                "ContentLength": content_length,
+            },
+            ExpiresIn=expires_in,
+        )
+
+    def get_object(self, bucket: str, key: str) -> bytes:
+        return self.client(bucket).get_object(Bucket=bucket, Key=key)["Body"].read()
+
+    def head_object(self, bucket: str, key: str) -> dict | None:
+        try:
+            resp = self.client(bucket).head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return {"size": resp["ContentLength"], "content_type": resp.get("ContentType", "")}
+
+
+class MemoryStorage(StorageBackend):
+    """
+    In-process dict of (bucket, key) -> (body, content_type).
+    """
+
+    def __init__(self):
+        self.objects: dict[tuple[str, str], tuple[bytes, str]] = {}
+        self._lock = threading.Lock()
+
+    def put_object(self, bucket: str, key: str, body: bytes, content_type: str) -> None:
+        with self._lock:
+            self.objects[(bucket, key)] = (bytes(body), content_type)
+
+    def presign_get(self, bucket: str, key: str, expires_in: int) -> str:
+        return f"memory://{bucket}/{quote(key)}?expires={expires_in}"
+
+    def presign_put(
+        self, bucket: str, key: str, content_type: str, content_length: int, expires_in: int
+    ) -> str:
+        return f"memory://{bucket}/{quote(key)}?expires={expires_in}&method=PUT"
+
+    def get_object(self, bucket: str, key: str) -> bytes:
+        with self._lock:
+            return self.objects[(bucket, key)][0]
+
+    def head_object(self, bucket: str, key: str) -> dict | None:
+        with self._lock:
+            obj = self.objects.get((bucket, key))
+        if obj is None:
+            return None
+        return {"size": len(obj[0]), "content_type": obj[1]}
+
+
+class FileSystemStorage(StorageBackend):
+    """
+    Stores objects as files under `root/<bucket>/<key>`.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, bucket: str, key: str) -> Path:
+        path = (self.root / bucket / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise InvalidObjectKey("Invalid object key")
+        return path
+
+    def put_object(self, bucket: str, key: str, body: bytes, content_type: str) -> None:
+        path = self._path(bucket, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(body)
+
+    def upload_fileobj(
+        self,
+        bucket: str,
+        key: str,
+        fileobj: BinaryIO,
+        content_type: str,
+        max_bytes: int | None = None,
+    ) -> int:
+        path = self._path(bucket, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        total = 0
+        try:
+            with path.open("wb") as out:
+                for chunk in _read_chunks(fileobj, max_bytes):
+                    out.write(chunk)
+                    total += len(chunk)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        return total
+
+    def presign_get(self, bucket: str, key: str, expires_in: int) -> str:
+        return self._path(bucket, key).as_uri()
+
+    def presign_put(
+        self, bucket: str, key: str, content_type: str, content_length: int, expires_in: int
+    ) -> str:
+        return self._path(bucket, key).as_uri()
+
+    def get_object(self, bucket: str, key: str) -> bytes:
+        return self._path(bucket, key).read_bytes()
+
+    def head_object(self, bucket: str, key: str) -> dict | None:
+        path = self._path(bucket, key)
+        if not path.is_file():
+            return None
+        # The filesystem stand-in does not keep content types.
+        return {"size": path.stat().st_size, "content_type": ""}
+
+
+_storage: StorageBackend | None = None
+_storage_lock = threading.Lock()
+
+
+def _build_storage() -> StorageBackend:
+    """
+    Pick the backend from STORAGE_BACKEND: "r2" (default), "memory" or
+    "filesystem" (rooted at STORAGE_LOCAL_DIR, default ./local_storage).
+    """
+    backend = os.getenv("STORAGE_BACKEND", "r2").lower()
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "filesystem":
+        return FileSystemStorage(os.getenv("STORAGE_LOCAL_DIR", "local_storage"))
+    return R2Storage()
+
+
+def get_storage() -> StorageBackend:
+    """
+    Process-wide storage backend, built on first use.
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = _build_storage()
+    return _storage
+
+
+def set_storage(backend: StorageBackend | None) -> None:
+    """
+    Swap the process-wide backend (e.g. MemoryStorage in tests); None rebuilds from env.
+    """
+    global _storage
+    with _storage_lock:
+        _storage = backend
@@ -0,0 +1,174 @@
+import os
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, literal, or_, select
+from sqlalchemy.orm import Session
+
+from .models import Post, User, friendships, timeline_entries
+
+
+# Authors with more friends than this are not fanned out on write; readers pull
+# their posts from the posts table instead (fan-out-on-read).
+# - TIMELINE_FANOUT_MAX_FRIENDS (optional, default 1000)
+TIMELINE_FANOUT_MAX_FRIENDS = int(os.getenv("TIMELINE_FANOUT_MAX_FRIENDS", "1000"))
+
+# How many of a new friend's latest posts are copied into the timeline on accept.
+# - TIMELINE_BACKFILL_POSTS (optional, default 50)
+TIMELINE_BACKFILL_POSTS = int(os.getenv("TIMELINE_BACKFILL_POSTS", "50"))
+
+
+def fan_out_post(db: Session, post_id: str, author: User | None) -> None:
+    """
+    Copy a new post into the timeline of each of its author's friends with a
+    single INSERT ... SELECT over the friendships index. Skipped for authors
+    above TIMELINE_FANOUT_MAX_FRIENDS. The caller commits.
+    """
+    if author is None or author.friend_count > TIMELINE_FANOUT_MAX_FRIENDS:
+        return
+    db.execute(
+        insert(timeline_entries).from_select(
+            ["user_id", "post_id", "author_id", "created_at"],
+            select(friendships.c.friend_id, Post.id, Post.user_id, Post.created_at)
+            .where(Post.id == post_id, friendships.c.user_id == Post.user_id),
+        )
+    )
+
+
+def _copy_recent_posts(db: Session, reader_id: str, author_id: str) -> None:
+    recent = (
+        select(Post.id)
+        .where(Post.user_id == author_id)
+        .order_by(Post.created_at.desc(), Post.id.desc())
+        .limit(TIMELINE_BACKFILL_POSTS)
+    )
+    db.execute(
+        insert(timeline_entries).from_select(
+            ["user_id", "post_id", "author_id", "created_at"],
+            select(literal(reader_id), Post.id, Post.user_id, Post.created_at)
+            .where(Post.id.in_(recent))
+            # Skip posts already in the timeline (e.g. re-accepting a request).
+            .where(
+                Post.id.not_in(
+                    select(timeline_entries.c.post_id).where(
+                        timeline_entries.c.user_id == reader_id,
+                        timeline_entries.c.author_id == author_id,
+                    )
+                )
+            ),
+        )
+    )
+
+
+def connect(db: Session, user_id: str, friend_id: str) -> None:
+    """
+    New friendship: seed each side's timeline with the other's latest posts.
+    """
+    _copy_recent_posts(db, user_id, friend_id)
+    _copy_recent_posts(db, friend_id, user_id)
+
+
+def disconnect(db: Session, user_id: str, friend_id: str) -> None:
+    """
+    Ended friendship: drop each side's posts from the other's timeline.
+    """
+    db.execute(
+        delete(timeline_entries).where(
+            or_(
+                (timeline_entries.c.user_id == user_id) & (timeline_entries.c.author_id == friend_id),
+                (timeline_entries.c.user_id == friend_id) & (timeline_entries.c.author_id == user_id),
+            )
+        )
+    )
+
+
+def remove_post(db: Session, post_id: str) -> None:
+    db.execute(delete(timeline_entries).where(timeline_entries.c.post_id == post_id))
+
+
+def rebuild_timelines(db: Session) -> int:
+    """
+    Rebuild every timeline from the friendships table: each friend's latest
+    TIMELINE_BACKFILL_POSTS posts, ranked per author with a window function,
+    in one INSERT ... SELECT. Returns the number of entries written. The caller
+    commits, then bumps the "friendships" version.
+    """
+    ranked = select(
+        Post.id,
+        Post.user_id,
+        Post.created_at,
+        func.row_number()
+        .over(partition_by=Post.user_id, order_by=(Post.created_at.desc(), Post.id.desc()))
+        .label("rank"),
+    ).subquery()
+    db.execute(delete(timeline_entries))
+    result = db.execute(
+        insert(timeline_entries).from_select(
+            ["user_id", "post_id", "author_id", "created_at"],
+            select(friendships.c.user_id, ranked.c.id, ranked.c.user_id, ranked.c.created_at)
+            .join_from(friendships, ranked, ranked.c.user_id == friendships.c.friend_id)
+            .where(ranked.c.rank <= TIMELINE_BACKFILL_POSTS),
+        )
+    )
+    return result.rowcount
+
+
+def _after(created_at_col, id_col, after: tuple[datetime, str] | None):
+    if after is None:
+        return created_at_col.isnot(None)
+    created_at, post_id = after
+    return (created_at_col < created_at) | ((created_at_col == created_at) & (id_col < post_id))
+
+
+def timeline_post_ids(
+    db: Session,
+    user_id: str,
+    limit: int,
+    after: tuple[datetime, str] | None = None,
+) -> list[tuple[datetime, str]]:
+    """
+    (created_at, post_id) of the next `limit` posts in `user_id`'s friends
+    timeline, newest first, strictly after the `after` keyset position.
+
+    Merges the user's timeline entries with the posts of friends above
+    TIMELINE_FANOUT_MAX_FRIENDS, which were never fanned out. Each side is a
+    range scan returning at most `limit` rows.
+    """
+    inbox = db.execute(
+        select(timeline_entries.c.created_at, timeline_entries.c.post_id)
+        .where(
+            timeline_entries.c.user_id == user_id,
+            _after(timeline_entries.c.created_at, timeline_entries.c.post_id, after),
+        )
+        .order_by(timeline_entries.c.created_at.desc(), timeline_entries.c.post_id.desc())
+        .limit(limit)
+    ).all()
+
+    large_friends = select(User.id).where(
+        User.id.in_(select(friendships.c.friend_id).where(friendships.c.user_id == user_id)),
+        User.friend_count > TIMELINE_FANOUT_MAX_FRIENDS,
+    )
+    pulled = db.execute(
+        select(Post.created_at, Post.id)
+        .where(Post.user_id.in_(large_friends), _after(Post.created_at, Post.id, after))
+        .order_by(Post.created_at.desc(), Post.id.desc())
+        .limit(limit)
+    ).all()
+
+    # A friend may have crossed the threshold after some posts were fanned out.
+    merged = {post_id: created_at for created_at, post_id in [*inbox, *pulled]}
+    return sorted(((c, p) for p, c in merged.items()), reverse=True)[:limit]
+
+
+if __name__ == "__main__":
+    # Operator command, run from server/: python -m app.timeline
+    from .database import SessionLocal
+    from .versions import bump
+
+    session = SessionLocal()
+    try:
+        entries = rebuild_timelines(session)
+        session.commit()
+        bump("friendships")
+        print({"entries": entries})
+    finally:
+        session.close()
@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+
+class SignedUrlCache:
+    """
+    Bounded LRU of presigned GET URLs keyed by (bucket, key).
+
+    A URL signed with ExpiresIn=N is reused for `reuse_fraction * N` seconds, so
+    every URL we hand out still has a good part of its lifetime left. Reusing the
+    same URL also lets browsers cache the media instead of re-downloading it each
+    time the signature changes.
+    """
+
+    def __init__(self, maxsize: int = 4096, reuse_fraction: float = 0.5):
+        self.maxsize = maxsize
+        self.reuse_fraction = reuse_fraction
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[str, str], tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_sign(self, bucket: str, key: str, expires_in: int, sign: Callable[[], str]) -> str:
+        """
+        Return a cached URL for (bucket, key) if it is still fresh, otherwise call
+        `sign()` and cache its result.
+        """
+        cache_key = (bucket, key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Sign outside the lock; two threads racing on the same key just both sign.
+        url = sign()
+
+        with self._lock:
+            self._entries[cache_key] = (url, now + expires_in * self.reuse_fraction)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return url
+
+    def validity_window(self, expires_in: int) -> float:
+        """
+        Seconds for which any URL we hand out for ExpiresIn=`expires_in` is still
+        guaranteed to be valid (a reused URL may be near the end of its reuse period).
+        """
+        return expires_in * (1 - self.reuse_fraction)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Shared by post media and profile picture signing.
+# - SIGNED_URL_CACHE_SIZE (optional, default 4096 entries)
+# - SIGNED_URL_REUSE_FRACTION (optional, default 0.5 of the URL's expiry)
+signed_url_cache = SignedUrlCache(
+    maxsize=int(os.getenv("SIGNED_URL_CACHE_SIZE", "4096")),
+    reuse_fraction=float(os.getenv("SIGNED_URL_REUSE_FRACTION", "0.5")),
+)
@@ -0,0 +1,181 @@
+import atexit
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Callable
+
+from fastapi import Request, Response
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from .database import engine
+from .models import CollectionVersion
+from .url_cache import signed_url_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+# Collections with a change counter in collection_versions.
+COLLECTIONS = ("quests", "posts", "comments", "users", "friendships")
+
+
+_bump_listeners: list[Callable[[dict[str, int]], None]] = []
+
+
+def on_bump(listener: Callable[[dict[str, int]], None]) -> None:
+    """
+    Call `listener` with {name: new version} after every successful bump() in
+    this process, e.g. so an in-memory copy can tell its own writes from other workers'.
+    """
+    _bump_listeners.append(listener)
+
+
+def bump(*names: str) -> dict[str, int]:
+    """
+    Mark collections as changed. Call once per request, after the write has
+    committed, with every collection it touched. Returns {name: new version}
+    ({} if the bump failed).
+
+    The counters are a handful of rows that every write updates, so they are
+    bumped in their own short transaction (in a fixed order, so two bumps never
+    deadlock) instead of being locked for the rest of the write's transaction.
+    Bumping after the commit cannot pair a new ETag with old data, because
+    not_modified() reads the versions before the list query runs. Errors are
+    logged: the write itself has already succeeded.
+    """
+    versions = {}
+    try:
+        with engine.begin() as conn:
+            for name in sorted(set(names)):
+                version = conn.execute(
+                    update(CollectionVersion)
+                    .where(CollectionVersion.name == name)
+                    .values(version=CollectionVersion.version + 1, updated_at=func.now())
+                    .returning(CollectionVersion.version)
+                ).scalar()
+                if version is not None:
+                    versions[name] = version
+    except Exception:
+        logger.exception("Failed to bump collection versions %s", names)
+        return {}
+    for listener in _bump_listeners:
+        try:
+            listener(versions)
+        except Exception:
+            logger.exception("Collection version listener failed")
+    return versions
+
+
+# - VERSION_BUMP_INTERVAL_SECONDS (optional, default 1; 0 bumps at once)
+BUMP_INTERVAL_SECONDS = float(os.getenv("VERSION_BUMP_INTERVAL_SECONDS", "1"))
+
+_pending: set[str] = set()
+_pending_lock = threading.Lock()
+_flush_timer: threading.Timer | None = None
+
+
+def bump_later(*names: str) -> None:
+    """
+    bump() for hot write paths (votes, shares, completions). Collections are
+    marked here and bumped together at most once per BUMP_INTERVAL_SECONDS per
+    worker, so concurrent voters do not queue on the collection_versions rows.
+    ETags of lists that show vote totals or counts can lag such a write by up
+    to that interval.
+    """
+    global _flush_timer
+    if BUMP_INTERVAL_SECONDS <= 0:
+        bump(*names)
+        return
+    with _pending_lock:
+        _pending.update(names)
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(BUMP_INTERVAL_SECONDS, flush_pending_bumps)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+
+
+@atexit.register
+def flush_pending_bumps() -> None:
+    """
+    Bump everything bump_later() has marked so far (also run at exit).
+    """
+    global _flush_timer
+    with _pending_lock:
+        names = tuple(_pending)
+        _pending.clear()
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+    if names:
+        bump(*names)
+
+
+def signed_url_epoch() -> int:
+    """
+    A counter that moves on before any signed URL we may have put in a response
+    expires, for ETags of responses that embed signed URLs.
+    """
+    expires = min(
+        int(os.getenv("R2_SIGNED_URL_EXPIRES_SECONDS", "3600")),
+        int(os.getenv("R2_PFP_SIGNED_URL_EXPIRES_SECONDS", "3600")),
+    )
+    return int(time.time() // max(1.0, signed_url_cache.validity_window(expires)))
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; they are UTC (server_default=now()).
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # If-None-Match uses weak comparison, so W/"x" and "x" are the same tag.
+    wanted = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in wanted or etag.removeprefix("W/") in wanted
+
+
+def not_modified(
+    db: Session,
+    request: Request,
+    response: Response,
+    collections: tuple[str, ...],
+    *parts,
+    private: bool = True,
+) -> Response | None:
+    """
+    Conditional GET for a list endpoint. Call before running the list query.
+
+    The ETag covers the versions of `collections` plus `parts`: every request
+    parameter that shapes the body, and the user id for responses with a
+    per-user overlay such as my_vote. If the request's If-None-Match matches,
+    returns a 304 to send as is. Otherwise sets ETag / Last-Modified on
+    `response` and returns None.
+    """
+    rows = (
+        db.query(CollectionVersion.name, CollectionVersion.version, CollectionVersion.updated_at)
+        .filter(CollectionVersion.name.in_(collections))
+        .all()
+    )
+    if len(rows) != len(collections):
+        return None  # not seeded yet; serve without validators
+
+    versions = sorted((r.name, r.version) for r in rows)
+    digest = hashlib.sha1(repr((versions, parts)).encode("utf-8")).hexdigest()[:20]
+    headers = {
+        "ETag": f'W/"{digest}"',
+        "Cache-Control": "private, no-cache" if private else "no-cache",
+    }
+    updated = [r.updated_at for r in rows if r.updated_at is not None]
+    if updated:
+        headers["Last-Modified"] = format_datetime(max(_as_utc(u) for u in updated), usegmt=True)
+
+    if _matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,132 @@
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .models import Post, PostVote, Quest, QuestVote
+from .versions import bump
+
+
+# kind -> (item model, per-user vote model, vote column pointing at the item)
+VOTE_TARGETS = {
+    "quest": (Quest, QuestVote, "quest_id"),
+    "post": (Post, PostVote, "post_id"),
+}
+
+
+class InvalidVoteTransition(Exception):
+    pass
+
+
+def apply_vote_delta(db: Session, model, item_id: str, delta: int):
+    """
+    Add `delta` to model.votes as a single `UPDATE ... SET votes = votes + :delta`
+    and return the updated row (None if there is no such item).
+
+    The database applies the increment atomically, so concurrent voters on the
+    same quest/post cannot overwrite each other's changes the way a Python-side
+    read-modify-write (`item.votes += delta`) can. The caller commits.
+    """
+    table = model.__table__
+    return db.execute(
+        update(table)
+        .where(table.c.id == item_id)
+        .values(votes=func.coalesce(table.c.votes, 0) + delta)
+        .returning(*table.c)
+    ).first()
+
+
+def _upsert_vote(db: Session, vote_model, fk: str, item_id: str, user_id: str, delta: int) -> int:
+    """
+    INSERT the vote, or add `delta` to the existing one via the
+    uq_*_votes_*_user constraint, in one statement. Returns the new value.
+    """
+    table = vote_model.__table__
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(table).values(
+        **{fk: item_id},
+        user_id=user_id,
+        value=delta,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[fk, "user_id"],
+        set_={"value": table.c.value + stmt.excluded.value},
+    ).returning(table.c.value)
+    return int(db.execute(stmt).scalar_one())
+
+
+def cast_vote(db: Session, kind: str, item_id: str, user_id: str, delta: int):
+    """
+    Apply one user's vote change (`delta`, as sent by the client) to a quest or
+    post inside the caller's transaction.
+
+    Returns (item row, the user's new vote), or None if the item does not exist.
+    Raises InvalidVoteTransition if the vote would leave -1..1; the caller must
+    then roll back. The caller commits, then calls bump_later("quests" / "posts").
+    """
+    model, vote_model, fk = VOTE_TARGETS[kind]
+    item = apply_vote_delta(db, model, item_id, delta)
+    if item is None:
+        return None
+
+    value = _upsert_vote(db, vote_model, fk, item_id, user_id, delta)
+    if value not in (-1, 0, 1):
+        raise InvalidVoteTransition()
+    if value == 0:
+        # 0 is represented by not having a row.
+        table = vote_model.__table__
+        db.execute(delete(table).where(table.c[fk] == item_id, table.c.user_id == user_id))
+    return item, value
+
+
+def _reconcile(db: Session, model, vote_model, fk) -> int:
+    row_total = (
+        select(func.coalesce(func.sum(vote_model.value), 0))
+        .where(fk == model.id)
+        .scalar_subquery()
+    )
+    # Rows whose history is unknown keep their total; the part the vote rows
+    # do not explain is recorded as the offset.
+    db.execute(
+        update(model)
+        .where(model.vote_offset.is_(None))
+        .values(vote_offset=func.coalesce(model.votes, 0) - row_total)
+        .execution_options(synchronize_session=False)
+    )
+    total = model.vote_offset + row_total
+    result = db.execute(
+        update(model)
+        .where(or_(model.votes.is_(None), model.votes != total))
+        .values(votes=total)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def reconcile_vote_totals(db: Session) -> dict:
+    """
+    Recompute quests.votes / posts.votes as vote_offset plus the sum of the
+    per-user rows in quest_votes / post_votes. Returns how many rows were corrected.
+
+    Rows from before per-user votes were recorded (vote_offset NULL) first get
+    their offset set from the current total, so their legacy votes are kept.
+    """
+    fixed = {
+        "quests": _reconcile(db, Quest, QuestVote, QuestVote.quest_id),
+        "posts": _reconcile(db, Post, PostVote, PostVote.post_id),
+    }
+    db.commit()
+    bump("quests", "posts")
+    return fixed
+
+
+if __name__ == "__main__":
+    # Operator command (e.g. from cron), run from server/: python -m app.votes
+    # Workers pick the new totals up on their next leaderboard refresh.
+    from .database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        print(reconcile_vote_totals(session))
+    finally:
+        session.close()
@@ -0,0 +1,87 @@
+import os
+import tempfile
+
+# The app reads its configuration at import time, so set it up before importing it.
+_tmpdir = tempfile.mkdtemp(prefix="quests-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmpdir}/test.db"
+os.environ["JWT_SECRET"] = "test-secret"
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["R2_BUCKET"] = "posts"
+os.environ["R2_PFP_BUCKET"] = "pfps"
+os.environ["QUEST_LIST_CACHE_TTL_SECONDS"] = "0"
+os.environ["VERSION_BUMP_INTERVAL_SECONDS"] = "0"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database import Base, SessionLocal, engine
+from app.leaderboards import quest_leaderboard
+from app.main import app
+
+
+@pytest.fixture
+def client():
+    """
+    TestClient on a fresh, empty database.
+    """
+    Base.metadata.drop_all(bind=engine)
+    with TestClient(app) as c:
+        db = SessionLocal()
+        try:
+            quest_leaderboard.rebuild(db)
+        finally:
+            db.close()
+        yield c
+
+
+@pytest.fixture
+def db(client):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def signup(client):
+    """
+    Create a user; returns (user id, Authorization headers).
+    """
+
+    def _signup(username: str) -> tuple[str, dict]:
+        body = client.post("/auth/signup", json={"username": username, "password": "pw"}).json()
+        return body["user"]["id"], {"Authorization": f"Bearer {body['token']}"}
+
+    return _signup
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements: list[str] = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+@pytest.fixture
+def count_queries():
+    """
+    Context manager counting the SQL statements run inside it.
+    """
+
+    class _Counting:
+        def __enter__(self):
+            self.counter = QueryCounter()
+            event.listen(engine, "before_cursor_execute", self.counter)
+            return self.counter
+
+        def __exit__(self, *exc):
+            event.remove(engine, "before_cursor_execute", self.counter)
+
+    return _Counting
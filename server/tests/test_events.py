@@ -0,0 +1,79 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app import events
+from app.events import LocalBackend, RedisBackend
+from app.security import create_token, get_stream_user_id
+
+
+def test_stream_url_only_accepts_stream_tokens(client, signup):
+    me_id, headers = signup("me")
+
+    # A login token in the URL would end up in access logs.
+    assert client.get("/events/", params={"token": create_token(me_id)}).status_code == 401
+
+    stream_token = client.post("/events/token", headers=headers).json()["token"]
+    assert get_stream_user_id(token=stream_token, creds=None) == me_id
+
+
+def test_stream_tokens_are_not_login_tokens(client, signup):
+    _, headers = signup("me")
+    stream_token = client.post("/events/token", headers=headers).json()["token"]
+
+    response = client.get("/friends/list", headers={"Authorization": f"Bearer {stream_token}"})
+    assert response.status_code == 401
+    with pytest.raises(HTTPException):
+        get_stream_user_id(token="not-a-jwt", creds=None)
+
+
+def test_local_publish_before_any_stream_is_a_no_op():
+    LocalBackend().publish(["someone"], b"data: {}\n\n")
+
+
+class _Stop(BaseException):
+    pass
+
+
+class _FlakyRedis:
+    """pubsub() fails once, then delivers one message, then stops the test."""
+
+    def __init__(self):
+        self.connects = 0
+
+    def pubsub(self, ignore_subscribe_messages=True):
+        self.connects += 1
+        if self.connects == 1:
+            raise ConnectionError("redis went away")
+        return self
+
+    def subscribe(self, channel):
+        pass
+
+    def listen(self):
+        yield {"data": json.dumps({"to": ["me"], "message": "data: {}\n\n"})}
+        raise _Stop
+
+
+class _Broker:
+    def __init__(self):
+        self.delivered = []
+
+    def deliver(self, user_ids, message):
+        self.delivered.append((user_ids, message))
+
+
+def test_redis_listener_reconnects_after_errors(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(events.time, "sleep", sleeps.append)
+    redis = _FlakyRedis()
+    backend = RedisBackend(redis)
+    backend.broker = _Broker()
+
+    with pytest.raises(_Stop):
+        backend._listen()
+
+    assert redis.connects == 2
+    assert sleeps == [1.0]
+    assert backend.broker.delivered == [(["me"], b"data: {}\n\n")]
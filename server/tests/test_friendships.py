@@ -0,0 +1,54 @@
+from sqlalchemy import func, insert, select, text
+
+from app.database import engine
+from app.friendships import backfill_friendships, ensure_unique_index
+from app.models import FriendRequest, User, friendships
+
+
+def test_duplicate_friendships_are_collapsed_before_the_unique_index(client, db, signup):
+    me_id, headers = signup("me")
+    friend = User(username="friend", password="x")
+    db.add(friend)
+    db.commit()
+    # A database written by the old /friends/add: no unique index, duplicate rows.
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_friendships_user_friend"))
+        conn.execute(insert(friendships), [
+            {"user_id": me_id, "friend_id": friend.id},
+            {"user_id": me_id, "friend_id": friend.id},
+            {"user_id": friend.id, "friend_id": me_id},
+        ])
+
+    with engine.begin() as conn:
+        ensure_unique_index(conn)
+
+    pairs = db.execute(select(friendships.c.user_id, friendships.c.friend_id)).all()
+    assert sorted(pairs) == sorted([(me_id, friend.id), (friend.id, me_id)])
+    assert db.get(User, me_id).friend_count == 1
+
+    # add_friendship's ON CONFLICT now has its index to resolve against.
+    assert client.post("/friends/add", params={"username": "friend"}, headers=headers).json() == {"ok": True}
+    assert db.execute(select(func.count()).select_from(friendships)).scalar() == 2
+
+
+def test_backfill_adds_accepted_requests_and_keeps_other_friendships(client, db, signup):
+    me_id, headers = signup("me")
+    signup("b")
+    c = User(username="c", password="x")
+    db.add(c)
+    db.commit()
+    assert client.post("/friends/add", params={"username": "b"}, headers=headers).json() == {"ok": True}
+    # Accepted before friendships was kept up to date: no adjacency rows yet.
+    db.add(FriendRequest(from_user_id=c.id, to_user_id=me_id, status="accepted"))
+    db.commit()
+
+    with engine.begin() as conn:
+        assert backfill_friendships(conn) == 2
+    with engine.begin() as conn:
+        assert backfill_friendships(conn) == 0  # idempotent
+
+    friends = client.get("/friends/list", headers=headers).json()
+    assert sorted(f["username"] for f in friends) == ["b", "c"]
+    db.expire_all()
+    assert db.get(User, me_id).friend_count == 2
+    assert client.post("/friends/backfill_friendships").status_code in (404, 405)
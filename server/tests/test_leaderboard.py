@@ -0,0 +1,111 @@
+from sqlalchemy import update
+
+from app.database import engine
+from app.leaderboards import QuestLeaderboard, quest_leaderboard
+from app.models import CollectionVersion, Quest
+from app.response_cache import quest_list_cache
+
+
+def _bump_from_another_worker() -> None:
+    # bump() would tell this worker's leaderboard it was a local write.
+    with engine.begin() as conn:
+        conn.execute(
+            update(CollectionVersion)
+            .where(CollectionVersion.name == "quests")
+            .values(version=CollectionVersion.version + 1)
+        )
+
+
+def test_quest_list_returns_every_quest_by_default(client, db):
+    db.add_all([Quest(title=f"q{i}", icon="*", votes=i % 7) for i in range(150)])
+    db.commit()
+    quest_leaderboard.rebuild(db)
+
+    quests = client.get("/quests/").json()
+
+    assert len(quests) == 150
+    assert len(client.get("/quests/", params={"limit": 20, "offset": 140}).json()) == 10
+
+
+def test_quest_list_and_with_votes_break_ties_the_same_way(client, db, signup):
+    _, headers = signup("me")
+    db.add_all([Quest(title=f"q{i}", icon="*", votes=1 if i % 2 else 3) for i in range(10)])
+    db.commit()
+    quest_leaderboard.rebuild(db)
+
+    listed = [q["id"] for q in client.get("/quests/").json()]
+    with_votes = [q["id"] for q in client.get("/quests/with_votes", headers=headers).json()]
+
+    assert listed == with_votes
+
+
+def test_votes_from_other_workers_show_up_after_sync(client, db, monkeypatch):
+    quest = Quest(title="q", icon="*", votes=0)
+    db.add(quest)
+    db.commit()
+    quest_leaderboard.rebuild(db)
+    monkeypatch.setattr(quest_leaderboard, "sync_seconds", 0)
+
+    # Another worker's vote: the row and version change, this worker's board does not.
+    db.execute(update(Quest).where(Quest.id == quest.id).values(votes=4))
+    db.commit()
+    _bump_from_another_worker()
+
+    assert client.get("/quests/").json()[0]["votes"] == 4
+
+
+def test_cached_listing_follows_leaderboard_rebuilds(client, db, monkeypatch):
+    quest = Quest(title="q", icon="*", votes=0)
+    db.add(quest)
+    db.commit()
+    quest_leaderboard.rebuild(db)
+    monkeypatch.setattr(quest_list_cache, "ttl", 60)
+    monkeypatch.setattr(quest_leaderboard, "sync_seconds", 0)
+    assert client.get("/quests/").json()[0]["votes"] == 0  # now cached
+
+    # Another worker's vote does not invalidate this worker's cache, but the
+    # rebuild it triggers changes the cache key.
+    db.execute(update(Quest).where(Quest.id == quest.id).values(votes=2))
+    db.commit()
+    _bump_from_another_worker()
+
+    assert client.get("/quests/").json()[0]["votes"] == 2
+
+
+def test_local_votes_and_other_workers_writes_do_not_rebuild(client, db, signup, monkeypatch):
+    _, headers = signup("me")
+    quests = [Quest(title=f"q{i}", icon="*", votes=0) for i in range(3)]
+    db.add_all(quests)
+    db.commit()
+    quest_leaderboard.rebuild(db)
+    monkeypatch.setattr(quest_leaderboard, "sync_seconds", 0)
+    rebuilds = []
+    monkeypatch.setattr(QuestLeaderboard, "rebuild", lambda self, db: rebuilds.append(1))
+
+    for q in quests:
+        assert client.post(f"/quests/{q.id}/vote", params={"delta": 1}, headers=headers).status_code == 200
+        client.get("/quests/")
+    db.execute(update(Quest).where(Quest.id == quests[0].id).values(votes=9))
+    db.commit()
+    _bump_from_another_worker()
+    listed = client.get("/quests/").json()
+
+    assert rebuilds == []
+    assert [(q["id"], q["votes"]) for q in listed] == [
+        (quests[0].id, 9),
+        *sorted(((q.id, 1) for q in quests[1:]), reverse=True),
+    ]
+
+
+def test_listings_carry_difficulty_for_every_quest(client, db, signup):
+    _, headers = signup("me")
+    db.add_all([Quest(title=f"q{i}", icon="*", received_count=4, completed_count=i % 5) for i in range(250)])
+    db.commit()
+    quest_leaderboard.rebuild(db)
+
+    public = client.get("/quests/", params={"include_difficulty": "true"}).json()
+    mine = client.get("/quests/with_votes", params={"include_difficulty": "true", "limit": 500}, headers=headers).json()
+
+    for listing in (public, mine):
+        assert len(listing) == 250
+        assert {q["completion_rate"] for q in listing} == {0.0, 25.0, 50.0, 75.0, 100.0}
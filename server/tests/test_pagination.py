@@ -0,0 +1,75 @@
+from app.friendships import add_friendship
+from app.models import Post, PostComment, Quest, User
+from app.timeline import fan_out_post
+
+
+def _pages(client, url: str, headers: dict, limit: int = 2, **query) -> list[list[str]]:
+    pages, cursor = [], None
+    while True:
+        params = {**query, "limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get(url, params=params, headers=headers)
+        assert response.status_code == 200
+        pages.append([row["id"] for row in response.json()])
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            return pages
+        assert len(pages) < 10, "cursor did not advance"
+
+
+def _seed_posts(db, author: User, count: int) -> list[str]:
+    quest = Quest(title="q", icon="*")
+    db.add(quest)
+    db.flush()
+    posts = [Post(quest_id=quest.id, user_id=author.id, media_url=f"posts/{i}.jpg", media_type="image") for i in range(count)]
+    db.add_all(posts)
+    db.flush()
+    for post in posts:
+        fan_out_post(db, post.id, author)
+    db.commit()
+    return [p.id for p in posts]
+
+
+def test_recent_and_friends_pages_cover_every_post_once(client, db, signup):
+    me_id, headers = signup("me")
+    friend = User(username="friend", password="x")
+    db.add(friend)
+    db.flush()
+    add_friendship(db, me_id, friend.id)
+    # Created back to back, typically within the same second.
+    post_ids = _seed_posts(db, friend, 5)
+
+    for mode in ("recent", "friends"):
+        pages = _pages(client, "/posts/", headers, mode=mode)
+        seen = [post_id for page in pages for post_id in page]
+        assert sorted(seen) == sorted(post_ids), mode
+        assert [len(p) for p in pages] == [2, 2, 1], mode
+
+
+def test_comment_pages_cover_every_comment_in_order(client, db, signup):
+    me_id, headers = signup("me")
+    author = db.get(User, me_id)
+    post_id = _seed_posts(db, author, 1)[0]
+    comments = [PostComment(post_id=post_id, user_id=me_id, content=str(i)) for i in range(5)]
+    db.add_all(comments)
+    db.commit()
+
+    pages = _pages(client, f"/posts/{post_id}/comments", headers)
+    seen = [comment_id for page in pages for comment_id in page]
+    expected = [c.id for c in sorted(comments, key=lambda c: (c.created_at, c.id))]
+    assert seen == expected
+
+
+def test_quest_pages_include_quests_with_null_votes(client, db, signup):
+    _, headers = signup("me")
+    quests = [Quest(title=f"q{i}", icon="*", votes=v) for i, v in enumerate([2, 1, 0, 0, 0])]
+    db.add_all(quests)
+    db.flush()
+    for q in quests[3:]:
+        q.votes = None  # written before votes had a default
+    db.commit()
+
+    pages = _pages(client, "/quests/with_votes", headers)
+    seen = [quest_id for page in pages for quest_id in page]
+
+    assert sorted(seen) == sorted(q.id for q in quests)
+    assert seen[:2] == [quests[0].id, quests[1].id]
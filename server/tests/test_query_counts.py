@@ -0,0 +1,89 @@
+"""
+List endpoints must run a fixed number of SQL statements however many rows
+they return (no per-row db.get()).
+"""
+import pytest
+
+from app.friendships import add_friendship
+from app.models import CompletedQuest, FriendRequest, Post, PostComment, Quest, ReceivedQuest, User
+from app.timeline import fan_out_post
+
+
+def _seed(db, me_id: str, rows: int) -> dict:
+    """
+    `rows` items for every list below, each pointing at a different user and
+    quest so a per-row lookup would show up as extra statements.
+    """
+    me = db.get(User, me_id)
+    others = [User(username=f"u{i}", password="x", pfp_key=f"pfp/u{i}.jpg") for i in range(rows)]
+    quests = [Quest(title=f"q{i}", icon="*", votes=i) for i in range(rows)]
+    db.add_all(others + quests)
+    db.flush()
+
+    post_ids = []
+    for user, quest in zip(others, quests):
+        add_friendship(db, me.id, user.id)
+        post = Post(quest_id=quest.id, user_id=user.id, media_url=f"posts/{user.id}.jpg", media_type="image")
+        db.add(post)
+        db.flush()
+        fan_out_post(db, post.id, user)
+        post_ids.append(post.id)
+        db.add(ReceivedQuest(user_id=me.id, quest_id=quest.id))
+        db.add(CompletedQuest(user_id=me.id, quest_id=quest.id))
+        db.add(FriendRequest(from_user_id=user.id, to_user_id=me.id, status="pending"))
+    for user in others:
+        db.add(PostComment(post_id=post_ids[0], user_id=user.id, content="hi"))
+    db.commit()
+    return {"post_id": post_ids[0], "username": me.username}
+
+
+ENDPOINTS = {
+    "/posts/?mode=all": 5,
+    "/posts/?mode=recent": 5,
+    "/posts/?mode=friends": 7,
+    "/posts/{post_id}/comments": 4,
+    "/quests/with_votes": 1,
+    "/quests/received": 2,
+    "/quests/completed": 2,
+    "/quests/completed/by-user/{me_id}": 2,
+    "/quests/completed/by-username/{username}": 3,
+    "/friends/incoming": 2,
+    "/friends/list": 1,
+}
+
+
+@pytest.mark.parametrize("rows", [2, 10])
+@pytest.mark.parametrize("path", ENDPOINTS)
+def test_list_endpoint_query_count(client, db, signup, count_queries, path, rows):
+    me_id, headers = signup("me")
+    seeded = _seed(db, me_id, rows)
+    url = path.format(me_id=me_id, **seeded)
+
+    with count_queries() as counter:
+        response = client.get(url, headers=headers)
+
+    assert response.status_code == 200
+    assert len(response.json()) == rows
+    assert counter.count == ENDPOINTS[path], counter.statements
+
+
+def test_post_vote_statement_count(client, db, signup, count_queries):
+    me_id, headers = signup("me")
+    poster = User(username="poster", password="x")
+    quest = Quest(title="q", icon="*")
+    db.add_all([poster, quest])
+    db.flush()
+    post = Post(quest_id=quest.id, user_id=poster.id, media_url="posts/p.jpg", media_type="image", votes=0)
+    db.add(post)
+    db.commit()
+    post_id = post.id
+
+    with count_queries() as counter:
+        response = client.post(f"/posts/{post_id}/vote", params={"delta": 1}, headers=headers)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["votes"], body["my_vote"], body["quest_title"], body["poster_username"]) == (1, 1, "q", "poster")
+    # UPDATE ... RETURNING, the vote upsert, quest + poster; plus the version
+    # bump (immediate in tests, see VERSION_BUMP_INTERVAL_SECONDS).
+    assert counter.count == 4, counter.statements
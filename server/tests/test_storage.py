@@ -0,0 +1,79 @@
+import io
+
+import pytest
+
+from app.models import Quest
+from app import storage as storage_module
+from app.storage import FileSystemStorage, InvalidObjectKey, MemoryStorage, R2Storage, StorageBackend, set_storage
+
+
+def test_incomplete_backend_fails_at_construction():
+    class NoHead(StorageBackend):
+        def put_object(self, bucket, key, body, content_type):
+            pass
+
+        def presign_get(self, bucket, key, expires_in):
+            return ""
+
+        def presign_put(self, bucket, key, content_type, content_length, expires_in):
+            return ""
+
+        def get_object(self, bucket, key):
+            return b""
+
+    with pytest.raises(TypeError, match="head_object"):
+        NoHead()
+    MemoryStorage()
+
+
+def test_filesystem_storage_rejects_keys_outside_its_root(tmp_path):
+    with pytest.raises(InvalidObjectKey):
+        FileSystemStorage(str(tmp_path)).get_object("posts", "../../etc/passwd")
+
+
+def test_missing_r2_credentials_are_a_500(client, db, signup, monkeypatch):
+    _, headers = signup("me")
+    quest = Quest(title="q", icon="*")
+    db.add(quest)
+    db.commit()
+    for name in ("STORAGE_BACKEND", "R2_ACCOUNT_ID", "R2_ACCESS_KEY_ID", "R2_SECRET_ACCESS_KEY"):
+        monkeypatch.delenv(name, raising=False)
+    set_storage(None)  # rebuilt from env on next use: R2 without credentials
+    try:
+        response = client.post(
+            "/posts/upload",
+            data={"quest_id": quest.id},
+            files={"file": ("a.jpg", b"data", "image/jpeg")},
+            headers=headers,
+        )
+    finally:
+        set_storage(None)
+
+    assert response.status_code == 500
+    assert response.json() == {"detail": "R2 credentials not configured on server"}
+
+
+class _FailingS3:
+    """Multipart calls where upload_part and the abort both fail."""
+
+    def create_multipart_upload(self, **kwargs):
+        return {"UploadId": "upload-1"}
+
+    def upload_part(self, **kwargs):
+        raise ConnectionError("part upload failed")
+
+    def abort_multipart_upload(self, **kwargs):
+        raise ConnectionError("abort failed")
+
+
+def test_failed_abort_does_not_hide_the_upload_error(monkeypatch, caplog):
+    for name in ("R2_ACCOUNT_ID", "R2_ACCESS_KEY_ID", "R2_SECRET_ACCESS_KEY"):
+        monkeypatch.setenv(name, "x")
+    monkeypatch.setattr(storage_module, "UPLOAD_CHUNK_SIZE", 4)
+    r2 = R2Storage()
+    monkeypatch.setattr(r2, "client", lambda bucket: _FailingS3())
+
+    with pytest.raises(ConnectionError, match="part upload failed"):
+        r2.upload_fileobj("posts", "posts/big.mp4", io.BytesIO(b"12345678"), "video/mp4")
+
+    assert "upload-1" in caplog.text
@@ -0,0 +1,49 @@
+import warnings
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import SAWarning
+
+from app import timeline
+from app.friendships import add_friendship
+from app.models import Post, Quest, User, timeline_entries
+from app.timeline import rebuild_timelines
+
+
+def _friend_with_posts(db, me_id: str, username: str, count: int) -> list[str]:
+    friend = User(username=username, password="x")
+    quest = Quest(title="q", icon="*")
+    db.add_all([friend, quest])
+    db.flush()
+    posts = [Post(quest_id=quest.id, user_id=friend.id, media_url=f"posts/{i}.jpg", media_type="image") for i in range(count)]
+    db.add_all(posts)
+    db.flush()
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", SAWarning)
+        add_friendship(db, me_id, friend.id)
+    db.commit()
+    return [p.id for p in posts]
+
+
+def test_rebuild_keeps_each_friends_latest_posts(client, db, signup, monkeypatch):
+    me_id, headers = signup("me")
+    monkeypatch.setattr(timeline, "TIMELINE_BACKFILL_POSTS", 3)
+    first = _friend_with_posts(db, me_id, "a", 5)
+    second = _friend_with_posts(db, me_id, "b", 2)
+    seeded = set(db.execute(select(timeline_entries.c.post_id)).scalars())
+    db.execute(delete(timeline_entries))
+    db.commit()
+
+    entries = rebuild_timelines(db)
+    db.commit()
+
+    rebuilt = set(db.execute(select(timeline_entries.c.post_id)).scalars())
+    assert entries == len(rebuilt) == 5
+    assert rebuilt == seeded
+    latest = db.execute(
+        select(Post.id).where(Post.id.in_(first)).order_by(Post.created_at.desc(), Post.id.desc()).limit(3)
+    ).scalars()
+    assert rebuilt == set(latest) | set(second)
+
+
+def test_timeline_rebuild_is_not_an_http_route(client):
+    assert client.post("/posts/backfill_timeline").status_code in (404, 405)
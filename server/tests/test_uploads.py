@@ -0,0 +1,97 @@
+import statistics
+import threading
+import time
+
+from app.models import Quest
+from app.storage import MemoryStorage, get_storage, set_storage
+
+
+def _intent(client, headers: dict, quest_id: str) -> dict:
+    response = client.post(
+        "/posts/upload-intent",
+        json={"quest_id": quest_id, "content_type": "video/mp4", "size": 4, "filename": "clip.mp4"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_only_the_uploader_can_finalize_a_direct_upload(client, db, signup):
+    _, owner = signup("owner")
+    _, other = signup("other")
+    quest = Quest(title="q", icon="*")
+    db.add(quest)
+    db.commit()
+
+    intent = _intent(client, owner, quest.id)
+    get_storage().put_object("posts", intent["key"], b"data", "video/mp4")  # the browser's PUT
+    finalize = {"quest_id": quest.id, "key": intent["key"]}
+
+    assert client.post("/posts/upload-finalize", json=finalize, headers=other).status_code == 400
+
+    response = client.post("/posts/upload-finalize", json=finalize, headers=owner)
+    assert response.status_code == 200
+    assert response.json()["poster_username"] == "owner"
+
+
+class _SlowStorage(MemoryStorage):
+    """MemoryStorage with the latency of a remote object store."""
+
+    delay = 0.3
+
+    def put_object(self, bucket: str, key: str, body: bytes, content_type: str) -> None:
+        time.sleep(self.delay)
+        super().put_object(bucket, key, body, content_type)
+
+
+def _get_latency(client) -> float:
+    start = time.perf_counter()
+    assert client.get("/quests/").status_code == 200
+    return time.perf_counter() - start
+
+
+def test_get_latency_stays_flat_during_uploads(client, db, signup):
+    """
+    Benchmark: reads must not queue behind slow uploads. Uploads run on the
+    upload executor, so GET latency under a burst of uploads stays close to
+    the idle latency; prints the latencies (-s).
+    """
+    _, headers = signup("uploader")
+    quest = Quest(title="q", icon="*")
+    db.add(quest)
+    db.commit()
+    storage = _SlowStorage()
+    set_storage(storage)
+    try:
+        idle = statistics.median(_get_latency(client) for _ in range(20))
+
+        uploads, errors = 16, []
+
+        def upload():
+            response = client.post(
+                "/posts/upload",
+                data={"quest_id": quest.id},
+                files={"file": ("clip.mp4", b"data", "video/mp4")},
+                headers=headers,
+            )
+            if response.status_code != 200:
+                errors.append(response.text)
+
+        threads = [threading.Thread(target=upload) for _ in range(uploads)]
+        for t in threads:
+            t.start()
+        busy = []
+        while any(t.is_alive() for t in threads):
+            busy.append(_get_latency(client))
+        for t in threads:
+            t.join()
+    finally:
+        set_storage(None)
+    p95 = statistics.quantiles(busy, n=20)[-1]
+    print(f"\nGET /quests/: {idle * 1000:.1f}ms idle median, {statistics.median(busy) * 1000:.1f}ms median "
+          f"and {p95 * 1000:.1f}ms p95 over {len(busy)} GETs during {uploads} uploads")
+
+    assert errors == []
+    assert len([k for k in storage.objects if k[0] == "posts"]) == uploads
+    # A blocked event loop or request pool would hold GETs for whole uploads.
+    assert p95 < max(idle * 10, 0.1) < _SlowStorage.delay